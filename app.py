@@ -1,9 +1,12 @@
 
 import os
-from flask import Flask, send_from_directory
+import click
+from flask import Flask
 from flask_jwt_extended import JWTManager
 from config import Config
 from models import db
+from models.engine import configure_engine
+from models.schema import init_migrate
 
 
 def create_app():
@@ -13,11 +16,18 @@ def create_app():
     app.config.from_object(Config)
     
     # Ensure upload folder exists
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    if app.config['STORAGE_BACKEND'] == 'local':
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # Initialize extensions
     db.init_app(app)
+    configure_engine(app)
     jwt = JWTManager(app)
+
+    # Migrations are only run from the `flask` CLI; app servers skip
+    # importing Alembic
+    if click.get_current_context(silent=True) is not None:
+        init_migrate(app)
     
     # Register blueprints
     from routes.auth import auth_bp
@@ -25,17 +35,14 @@ def create_app():
     from routes.notifications import notifications_bp
     from routes.meals import meals_bp
     from routes.admin import admin_bp
+    from routes.uploads import uploads_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(coach_bp)
     app.register_blueprint(notifications_bp)
     app.register_blueprint(meals_bp)
     app.register_blueprint(admin_bp)
-    
-    # Serve uploaded files
-    @app.route('/uploads/<filename>')
-    def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    app.register_blueprint(uploads_bp)
     
     # Health check endpoint
     @app.route('/health')
@@ -87,28 +94,48 @@ def create_app():
                 },
                 'coach': {
                     'POST /api/coach/login': 'Coach login',
-                    'POST /api/coach/notifications': 'Create notification (coach auth required)',
-                    'GET /api/coach/users': 'List all users (coach auth required)',
-                    'PUT /api/coach/users/<id>/paid': 'Update user paid status (coach auth required)'
+                    'POST /api/coach/notifications': 'Create notification and queue push delivery (coach auth required)',
+                    'GET /api/coach/notifications/<id>/status': 'Push delivery progress (coach auth required)',
+                    'GET /api/coach/users': 'List users, paginated with ?page=&limit=&q=&filter=&sort=&order= (coach auth required)',
+                    'PUT /api/coach/users/<id>/paid': 'Update user paid status and optional paid_until (coach auth required)',
+                    'POST /api/coach/users/paid': 'Bulk update paid status by ids, phones or CSV (coach auth required)',
+                    'GET /api/coach/export/<users|notifications|meals>': 'Stream a CSV/JSONL export with ?format=&filter=&has_token=&created_from=&created_to= (coach auth required)'
                 },
                 'notifications': {
-                    'GET /api/notifications': 'Get user notifications (user auth required)'
+                    'GET /api/notifications': 'Get user notifications, paginated with ?limit=&cursor=&since= (user auth required)',
+                    'GET /api/notifications/unread-count': 'Unread notification count (user auth required)',
+                    'POST /api/notifications/read': 'Mark notifications read by ids, cursor or all (user auth required)'
                 },
                 'meals': {
                     'GET /api/meals': 'Get all meals',
                     'GET /api/meals/<id>': 'Get single meal',
+                    'GET /api/meals/search': 'Search meals by keyword (?query=&category=&limit=&offset=)',
                     'POST /api/meals': 'Create meal (coach auth required)',
                     'DELETE /api/meals/<id>': 'Delete meal (coach auth required)'
                 },
                 'admin': {
-                    'GET /admin/meals': 'Admin page for managing meals'
+                    'GET /admin/meals': 'Admin page for managing meals',
+                    'GET /admin/export/<users|notifications|meals>': 'Download a streamed CSV/JSONL export'
                 }
             }
         }
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # The schema is managed by migrations (`flask init-db`), so booting
+    # a worker never runs DDL
+    
+    # Register CLI commands. Only a process that serves requests (a WSGI
+    # server, `python app.py` or `flask run`) starts the push dispatch
+    # workers and, when enabled, the in-process subscription expiry
+    # scheduler; other `flask` commands must not claim push jobs and exit
+    from cli import register_commands
+    register_commands(app)
+
+    ctx = click.get_current_context(silent=True)
+    if ctx is None or ctx.info_name == 'run':
+        from services.dispatch import start_workers
+        from services.subscriptions import start_scheduler
+        start_workers(app)
+        start_scheduler(app)
     
     return app
 
@@ -0,0 +1,300 @@
+import re
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+
+
+def register_commands(app):
+    """Register the project's `flask` CLI commands"""
+    app.cli.add_command(init_db)
+    app.cli.add_command(push_worker)
+    app.cli.add_command(create_indexes)
+    app.cli.add_command(explain_queries)
+    app.cli.add_command(generate_image_variants)
+    app.cli.add_command(rebuild_inbox)
+    app.cli.add_command(expire_subscriptions)
+    app.cli.add_command(export)
+    app.cli.add_command(bench_passwords)
+    app.cli.add_command(bench_db)
+    app.cli.add_command(bench_startup)
+
+
+# (revision, down_revision) of migrations that only change data; databases
+# adopted from db.create_all() get the schema from the models but still
+# need these
+ADOPTION_DATA_MIGRATIONS = [
+    ('0006', '0005'),  # start unread counts at the newest notification
+]
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db():
+    """Create or upgrade the database schema; run once per deploy, not per worker"""
+    from flask import current_app
+    from flask_migrate import upgrade, stamp
+    from models import db
+    from models.schema import ensure_columns, ensure_indexes, init_migrate
+    from services.search import ensure_search_index
+
+    if 'migrate' not in current_app.extensions:
+        init_migrate(current_app)
+
+    inspector = db.inspect(db.engine)
+    if inspector.has_table('users') and not inspector.has_table('alembic_version'):
+        # Created by db.create_all() before migrations existed: bring it
+        # up to the models, replay the data migrations that schema
+        # adoption would skip, then record it as being at the latest revision
+        click.echo('Adopting existing database into migrations')
+        db.create_all()
+        ensure_columns()
+        ensure_indexes()
+        for revision, previous in ADOPTION_DATA_MIGRATIONS:
+            stamp(revision=previous)
+            upgrade(revision=revision)
+        stamp()
+    else:
+        upgrade()
+
+    # FTS5 table / GIN index, which depend on the database's capabilities
+    ensure_search_index()
+    click.echo('Database is up to date')
+
+
+@click.command('push-worker')
+@click.option('--once', is_flag=True, help='Drain the queue once and exit.')
+@with_appcontext
+def push_worker(once):
+    """Run a push dispatch worker in the foreground"""
+    from flask import current_app
+    from services.dispatch import requeue_stale_jobs, run_pending_jobs, run_worker
+
+    if once:
+        requeue_stale_jobs()
+        click.echo(f'Processed {run_pending_jobs()} push job(s)')
+        return
+
+    click.echo('Push worker started, press Ctrl+C to stop')
+    run_worker(current_app._get_current_object())
+
+
+@click.command('create-indexes')
+@with_appcontext
+def create_indexes():
+    """Add indexes declared on the models to an existing database"""
+    from models.schema import ensure_indexes
+
+    created = ensure_indexes()
+    for name in created:
+        click.echo(f'Created {name}')
+    click.echo(f'{len(created)} index(es) created')
+
+
+def _hot_queries():
+    from sqlalchemy import func
+    from models.user import User
+    from services.feed import feed_statement
+    from services.unread import unread_statement
+    from services.users import build_user_query
+
+    return {
+        'notification feed': feed_statement(1, True, inbox=False),
+        'notification feed, older page': feed_statement(1, True, cursor=(datetime.utcnow(), 1), inbox=False),
+        'notification inbox feed': feed_statement(1, True, inbox=True),
+        'unread count': unread_statement([1], func.count()),
+        'paid broadcast targets': User.query.filter(User.is_paid == True, User.fcm_token.isnot(None)).order_by(User.id),
+        'all broadcast targets': User.query.filter(User.fcm_token.isnot(None)).order_by(User.id),
+        'dead token prune': User.query.filter(User.fcm_token.in_(['token'])),
+        'admin user list': build_user_query().limit(50),
+        'admin paid user list': build_user_query('paid').limit(50),
+        'admin unpaid user list': build_user_query('unpaid').limit(50),
+    }
+
+
+# Plan steps that read a whole table or sort rows outside an index
+_SLOW_PLAN_STEPS = {
+    'sqlite': re.compile(r'^SCAN \S+$|USE TEMP B-TREE'),
+    'postgresql': re.compile(r'Seq Scan|(^|->)\s*(Incremental )?Sort\b(?! Key)'),
+}
+
+
+@click.command('explain-queries')
+@click.option('--check', is_flag=True,
+              help='Exit non-zero if a plan has a full table scan or a sort outside an index.')
+@with_appcontext
+def explain_queries(check):
+    """Print the query plan of the hot API queries"""
+    from models import db
+
+    dialect = db.engine.dialect
+    explain = 'EXPLAIN QUERY PLAN' if dialect.name == 'sqlite' else 'EXPLAIN'
+    slow = _SLOW_PLAN_STEPS.get(dialect.name)
+
+    failed = []
+    for name, query in _hot_queries().items():
+        statement = getattr(query, 'statement', query)
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        click.echo(f'-- {name}')
+        for row in db.session.execute(db.text(f'{explain} {sql}')):
+            step = str(row[-1])
+            flagged = check and slow is not None and slow.search(step.strip())
+            click.echo(('!! ' if flagged else '   ') + ' | '.join(str(col) for col in row))
+            if flagged and name not in failed:
+                failed.append(name)
+
+    if failed:
+        raise click.ClickException(f'Slow plan for: {", ".join(failed)}')
+
+
+@click.command('generate-image-variants')
+@with_appcontext
+def generate_image_variants():
+    """Create missing thumb/medium variants for existing meal and notification images"""
+    from models.meal import Meal
+    from models.notification import Notification
+    from services.images import variant_name, regenerate_variants
+    from services.storage import get_storage
+    from config import Config
+
+    storage = get_storage()
+    paths = {row[0] for row in Meal.query.with_entities(Meal.image_path).filter(Meal.image_path.isnot(None))}
+    paths |= {row[0] for row in Notification.query.with_entities(Notification.image_path)
+              .filter(Notification.image_path.isnot(None))}
+
+    generated = 0
+    for path in sorted(paths):
+        missing = [v for v in Config.IMAGE_VARIANTS if not storage.exists(variant_name(path, v))]
+        if missing and storage.exists(path):
+            regenerate_variants(path, storage)
+            generated += 1
+
+    click.echo(f'Generated variants for {generated} image(s)')
+
+
+@click.command('rebuild-inbox')
+@click.option('--batch-size', default=1000, show_default=True, help='Users per transaction.')
+@with_appcontext
+def rebuild_inbox(batch_size):
+    """Backfill the per-user notification inbox from the targeting rules"""
+    from services.inbox import rebuild_inbox as rebuild
+
+    added, removed = rebuild(batch_size)
+    click.echo(f'Inbox rebuilt: {added} row(s) added, {removed} removed')
+
+
+@click.command('expire-subscriptions')
+@click.option('--reminders/--no-reminders', default=None,
+              help='Push renewal reminders (default: SUBSCRIPTION_REMINDERS).')
+@with_appcontext
+def expire_subscriptions(reminders):
+    """Downgrade users past paid_until and remind those expiring soon"""
+    from services.subscriptions import run_subscription_jobs
+
+    result = run_subscription_jobs(reminders)
+    click.echo(f"Expired {result['expired']} subscription(s)")
+    if 'reminders' in result:
+        reminded = result['reminders']
+        click.echo(f"Reminded {reminded['reminded']} user(s), {reminded['sent']} push(es) delivered")
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(['users', 'notifications', 'meals']))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='File to write (default: stdout).')
+@click.option('--filter', 'filter_type', type=click.Choice(['paid', 'unpaid']), help='Users by paid status.')
+@click.option('--has-token/--no-token', default=None, help='Users with or without a device token.')
+@click.option('--created-from', help='ISO date or datetime (inclusive).')
+@click.option('--created-to', help='ISO date or datetime; a date includes that whole day.')
+@click.option('--batch-size', default=None, type=int, help='Rows fetched per round-trip.')
+@with_appcontext
+def export(kind, fmt, output, filter_type, has_token, created_from, created_to, batch_size):
+    """Stream users, notifications or meals as CSV or JSONL"""
+    from services.exports import build_export_query, stream_export, ExportError
+
+    filters = {
+        'filter': filter_type,
+        'has_token': None if has_token is None else str(has_token),
+        'created_from': created_from,
+        'created_to': created_to
+    }
+    try:
+        chunks = stream_export(build_export_query(kind, filters), fmt, batch_size)
+    except ExportError as e:
+        raise click.BadParameter(str(e))
+
+    for chunk in chunks:
+        output.write(chunk)
+
+
+@click.command('bench-passwords')
+@click.option('--method', 'methods', multiple=True, help='Hashing method to measure (repeatable).')
+@click.option('--seconds', default=2.0, show_default=True, help='Duration of each measurement.')
+def bench_passwords(methods, seconds):
+    """Report password verifications per second for each hashing setting"""
+    from config import Config
+    from services.passwords import benchmark, available_methods
+
+    methods = methods or available_methods()
+    threads = Config.PASSWORD_WORKERS
+
+    click.echo(f'Configured: {Config.PASSWORD_HASH_METHOD}, {threads} worker(s)')
+    for method in methods:
+        single = benchmark(method, seconds, threads=1)
+        pooled = benchmark(method, seconds, threads=threads)
+        click.echo(f'{method:<24} {single["per_second"]:8.1f}/s per core   '
+                   f'{pooled["per_second"]:8.1f}/s on {threads} thread(s)')
+
+
+@click.command('bench-db')
+@click.option('--url', default=None, help='Database to benchmark (default: a temporary SQLite file).')
+@click.option('--readers', default=8, show_default=True)
+@click.option('--writers', default=2, show_default=True)
+@click.option('--seconds', default=5.0, show_default=True)
+def bench_db(url, readers, writers, seconds):
+    """Compare read throughput under concurrent writes for each DB_PROFILE"""
+    from models.engine import benchmark_concurrency
+
+    for profile in ('default', 'tuned'):
+        result = benchmark_concurrency(url, profile, readers, writers, seconds)
+        p99 = f'{result["read_p99_ms"]:.1f}ms' if result['read_p99_ms'] is not None else '-'
+        click.echo(f'{profile:<8} reads {result["reads_per_second"]:9.1f}/s   '
+                   f'writes {result["writes_per_second"]:8.1f}/s   '
+                   f'errors {result["errors_per_second"]:6.1f}/s   read p99 {p99}')
+
+
+@click.command('bench-startup')
+@click.option('--runs', default=5, show_default=True, help='Cold starts to measure.')
+@click.option('--eager', multiple=True,
+              help='Module to import during startup as well, e.g. firebase_admin to compare with eager init.')
+def bench_startup(runs, eager):
+    """Measure cold-start time of importing the app (create_app) in fresh interpreters"""
+    import json
+    import os
+    import statistics
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    script = (
+        'import json, sys, time\n'
+        'start = time.perf_counter()\n'
+        f'for name in {list(eager)!r}: __import__(name)\n'
+        'import app\n'
+        'elapsed = time.perf_counter() - start\n'
+        'heavy = [m for m in ("firebase_admin", "alembic", "PIL.Image") if m in sys.modules]\n'
+        'print(json.dumps({"seconds": elapsed, "loaded": heavy}))\n'
+    )
+    env = dict(os.environ, PUSH_WORKER_THREADS='0')
+
+    timings, loaded = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result['seconds'] * 1000)
+        loaded = result['loaded']
+
+    click.echo(f'create_app cold start over {runs} run(s): median {statistics.median(timings):.0f}ms, '
+               f'min {min(timings):.0f}ms, max {max(timings):.0f}ms')
+    click.echo(f'Heavy modules loaded at startup: {", ".join(loaded) or "none"}')
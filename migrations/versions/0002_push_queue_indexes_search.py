@@ -0,0 +1,79 @@
+"""Push job queue, query indexes and meal search text
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 21:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+WITH_TOKEN = 'fcm_token IS NOT NULL'
+
+
+def upgrade():
+    op.create_table('push_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('notification_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('sent', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['notification_id'], ['notifications.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_push_jobs_notification_id', 'push_jobs', ['notification_id'])
+    op.create_index('ix_push_jobs_status', 'push_jobs', ['status'])
+
+    op.create_index('ix_users_fcm_token', 'users', ['fcm_token'])
+    op.create_index('ix_users_with_token', 'users', ['id'],
+                    sqlite_where=sa.text(WITH_TOKEN), postgresql_where=sa.text(WITH_TOKEN))
+    op.create_index('ix_users_paid_with_token', 'users', ['is_paid', 'id'],
+                    sqlite_where=sa.text(WITH_TOKEN), postgresql_where=sa.text(WITH_TOKEN))
+    op.create_index('ix_users_created_at', 'users', ['created_at'])
+    op.create_index('ix_users_name', 'users', ['name'])
+
+    op.create_index('ix_notifications_target_created', 'notifications', ['target_type', 'created_at', 'id'])
+    op.create_index('ix_notifications_target_user_created', 'notifications', ['target_user_id', 'created_at', 'id'])
+    op.create_index('ix_notifications_image_path', 'notifications', ['image_path'])
+
+    op.create_index('ix_meals_image_path', 'meals', ['image_path'])
+    op.add_column('meals', sa.Column('search_text', sa.Text(), nullable=True))
+
+
+def downgrade():
+    # The FTS5 search table and its triggers are created by `flask init-db`
+    # (services.search.ensure_search_index) over meals.search_text
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('meals_fts_ai', 'meals_fts_ad', 'meals_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS meals_fts')
+    elif op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_meals_search_tsv')
+
+    with op.batch_alter_table('meals') as batch_op:
+        batch_op.drop_column('search_text')
+    op.drop_index('ix_meals_image_path', table_name='meals')
+
+    op.drop_index('ix_notifications_image_path', table_name='notifications')
+    op.drop_index('ix_notifications_target_user_created', table_name='notifications')
+    op.drop_index('ix_notifications_target_created', table_name='notifications')
+
+    op.drop_index('ix_users_name', table_name='users')
+    op.drop_index('ix_users_created_at', table_name='users')
+    op.drop_index('ix_users_paid_with_token', table_name='users')
+    op.drop_index('ix_users_with_token', table_name='users')
+    op.drop_index('ix_users_fcm_token', table_name='users')
+
+    op.drop_table('push_jobs')
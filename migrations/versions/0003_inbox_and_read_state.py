@@ -0,0 +1,52 @@
+"""Per-user notification inbox and read state
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 21:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_inbox',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('notification_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('read_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['notification_id'], ['notifications.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'notification_id')
+    )
+    op.create_index('ix_inbox_user_created', 'notification_inbox', ['user_id', 'created_at', 'notification_id'])
+    op.create_index('ix_notification_inbox_notification_id', 'notification_inbox', ['notification_id'])
+
+    op.create_table('notification_reads',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('notification_id', sa.Integer(), nullable=False),
+        sa.Column('read_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['notification_id'], ['notifications.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'notification_id')
+    )
+    op.create_index('ix_notification_reads_notification_id', 'notification_reads', ['notification_id'])
+
+    op.add_column('users', sa.Column('notifications_seen_at', sa.DateTime(), nullable=True))
+    op.add_column('users', sa.Column('notifications_seen_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('notifications_seen_id')
+        batch_op.drop_column('notifications_seen_at')
+
+    op.drop_table('notification_reads')
+    op.drop_table('notification_inbox')
@@ -0,0 +1,29 @@
+"""Subscription end dates
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 23:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('paid_until', sa.DateTime(), nullable=True))
+    op.add_column('users', sa.Column('paid_reminder_sent_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_users_paid_until', 'users', ['is_paid', 'paid_until'])
+
+
+def downgrade():
+    op.drop_index('ix_users_paid_until', table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('paid_reminder_sent_at')
+        batch_op.drop_column('paid_until')
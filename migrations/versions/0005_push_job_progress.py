@@ -0,0 +1,48 @@
+"""Push job resume position, cascade push jobs with their notification
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 10:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# 0002 left the constraint unnamed on SQLite; batch mode needs a name to drop it
+NAMING = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+FK_NAME = 'fk_push_jobs_notification_id_notifications'
+
+
+def _notification_fk_name():
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys('push_jobs'):
+        if fk['referred_table'] == 'notifications':
+            return fk['name'] or FK_NAME
+    return None
+
+
+def _replace_notification_fk(batch_op, ondelete):
+    name = _notification_fk_name()
+    if name:
+        batch_op.drop_constraint(name, type_='foreignkey')
+    batch_op.create_foreign_key(FK_NAME, 'notifications', ['notification_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    with op.batch_alter_table('push_jobs', naming_convention=NAMING) as batch_op:
+        batch_op.add_column(sa.Column('last_user_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        _replace_notification_fk(batch_op, 'CASCADE')
+
+
+def downgrade():
+    with op.batch_alter_table('push_jobs', naming_convention=NAMING) as batch_op:
+        _replace_notification_fk(batch_op, None)
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('last_user_id')
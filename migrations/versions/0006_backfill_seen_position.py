@@ -0,0 +1,31 @@
+"""Start existing users' unread counts at the newest notification
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 11:05:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Users from before read state existed would otherwise count every
+    # notification ever sent as unread
+    op.execute(
+        "UPDATE users SET "
+        "notifications_seen_at = (SELECT created_at FROM notifications ORDER BY created_at DESC, id DESC LIMIT 1), "
+        "notifications_seen_id = (SELECT id FROM notifications ORDER BY created_at DESC, id DESC LIMIT 1) "
+        "WHERE notifications_seen_at IS NULL"
+    )
+
+
+def downgrade():
+    # Seen positions stay valid under 0005
+    pass
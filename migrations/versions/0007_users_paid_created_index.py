@@ -0,0 +1,23 @@
+"""Index the paid/unpaid user lists by signup date
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 12:30:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_paid_created', 'users', ['is_paid', 'created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_users_paid_created', table_name='users')
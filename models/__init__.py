@@ -5,3 +5,6 @@ db = SQLAlchemy()
 from .user import User
 from .notification import Notification
 from .meal import Meal
+from .push_job import PushJob
+from .inbox import InboxEntry
+from .notification_read import NotificationRead
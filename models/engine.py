@@ -0,0 +1,119 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from . import db
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    """Apply PRAGMAs to every new connection of a SQLite engine"""
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def configure_engine(app):
+    """Hook the DB_PROFILE connection settings onto the app's engine"""
+    if app.config['DB_PROFILE'] != 'tuned':
+        return
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            set_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+
+
+def benchmark_concurrency(uri=None, profile='tuned', readers=8, writers=2, seconds=5.0, rows=1000):
+    """
+    Measure point-read throughput while other threads keep writing
+
+    Runs against a scratch bench_rows table, by default in a temporary
+    SQLite file, so it never touches application data.
+
+    Returns:
+        dict with reads, writes and errors per second plus p99 read latency in ms
+    """
+    from config import Config, engine_options
+
+    scratch = None
+    if uri is None:
+        fd, scratch = tempfile.mkstemp(suffix='.db', prefix='bench-')
+        os.close(fd)
+        uri = f'sqlite:///{scratch}'
+
+    engine = create_engine(uri, **engine_options(uri, profile))
+    if profile == 'tuned' and engine.dialect.name == 'sqlite':
+        set_sqlite_pragmas(engine, Config.SQLITE_PRAGMAS)
+
+    with engine.begin() as conn:
+        conn.execute(text('DROP TABLE IF EXISTS bench_rows'))
+        conn.execute(text('CREATE TABLE bench_rows (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)'))
+        conn.execute(text('INSERT INTO bench_rows (id, value) VALUES (:id, 0)'),
+                     [{'id': i} for i in range(1, rows + 1)])
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    totals = {'reads': 0, 'writes': 0, 'errors': 0}
+    latencies = []
+
+    def read_loop():
+        count, samples, errors = 0, [], 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('SELECT value FROM bench_rows WHERE id = :id'),
+                                 {'id': random.randint(1, rows)}).scalar()
+                count += 1
+                samples.append(time.perf_counter() - start)
+            except OperationalError:
+                errors += 1
+        with lock:
+            totals['reads'] += count
+            totals['errors'] += errors
+            latencies.extend(samples)
+
+    def write_loop():
+        count, errors = 0, 0
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text('UPDATE bench_rows SET value = value + 1 WHERE id = :id'),
+                                 {'id': random.randint(1, rows)})
+                count += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            totals['writes'] += count
+            totals['errors'] += errors
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)] + \
+        [threading.Thread(target=write_loop) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    with engine.begin() as conn:
+        conn.execute(text('DROP TABLE bench_rows'))
+    engine.dispose()
+    if scratch:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(scratch + suffix):
+                os.remove(scratch + suffix)
+
+    latencies.sort()
+    return {
+        'profile': profile,
+        'reads_per_second': totals['reads'] / seconds,
+        'writes_per_second': totals['writes'] / seconds,
+        'errors_per_second': totals['errors'] / seconds,
+        'read_p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None
+    }
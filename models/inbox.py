@@ -0,0 +1,24 @@
+from . import db
+
+
+class InboxEntry(db.Model):
+    """A notification delivered to one user's feed, written when the notification is created"""
+
+    __tablename__ = 'notification_inbox'
+    __table_args__ = (
+        # A user's feed, newest first
+        db.Index('ix_inbox_user_created', 'user_id', 'created_at', 'notification_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'),
+                                primary_key=True, index=True)
+
+    # Copied from the notification so the feed is ordered without a join
+    created_at = db.Column(db.DateTime, nullable=False)
+    read_at = db.Column(db.DateTime, nullable=True)
+
+    notification = db.relationship('Notification')
+
+    def __repr__(self):
+        return f'<InboxEntry user={self.user_id} notification={self.notification_id}>'
@@ -10,11 +10,14 @@ class Meal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    image_path = db.Column(db.String(500), nullable=True)  # Uploaded image
+    image_path = db.Column(db.String(500), nullable=True, index=True)  # Uploaded image (content-addressed)
     link = db.Column(db.String(500), nullable=True)  # External link (e.g., recipe URL)
     category = db.Column(db.String(20), nullable=False, default='breakfast')  # breakfast, lunch, dinner, snacks
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Normalized title + description, maintained by services/search.py
+    search_text = db.Column(db.Text, nullable=True)
+
     def to_dict(self, base_url=''):
         """Convert meal to dictionary for JSON response"""
         result = {
@@ -26,11 +29,14 @@ class Meal(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
-        # Include full URL for uploaded images
+        # Include full URL for uploaded images, plus resized variants
         if self.image_path:
+            from services.images import variant_urls
             result['image'] = f"{base_url}/uploads/{self.image_path}"
+            result['images'] = variant_urls(self.image_path, base_url)
         else:
             result['image'] = None
+            result['images'] = None
 
         return result
 
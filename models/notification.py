@@ -6,10 +6,16 @@ class Notification(db.Model):
     """Notification model for coach-to-user notifications"""
     
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Feed lookups for 'all'/'paid' notifications, newest first
+        db.Index('ix_notifications_target_created', 'target_type', 'created_at', 'id'),
+        # A user's 'specific' notifications, newest first
+        db.Index('ix_notifications_target_user_created', 'target_user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.Text, nullable=True)  # Optional text content
-    image_path = db.Column(db.String(500), nullable=True)  # Optional uploaded image
+    image_path = db.Column(db.String(500), nullable=True, index=True)  # Optional uploaded image (content-addressed)
     image_url = db.Column(db.String(500), nullable=True)  # Optional external image URL
     
     # Targeting: 'all', 'paid', or 'specific'
@@ -33,11 +39,14 @@ class Notification(db.Model):
             'created_at': self.created_at.isoformat()
         }
         
-        # Include full URL for uploaded images
+        # Include full URL for uploaded images, plus resized variants
         if self.image_path:
+            from services.images import variant_urls
             result['image'] = f"{base_url}/uploads/{self.image_path}"
+            result['images'] = variant_urls(self.image_path, base_url)
         else:
             result['image'] = None
+            result['images'] = None
             
         return result
     
@@ -0,0 +1,16 @@
+from datetime import datetime
+from . import db
+
+
+class NotificationRead(db.Model):
+    """Explicit read acknowledgement of one notification by one user"""
+
+    __tablename__ = 'notification_reads'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'),
+                                primary_key=True, index=True)
+    read_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NotificationRead user={self.user_id} notification={self.notification_id}>'
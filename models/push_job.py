@@ -0,0 +1,45 @@
+from datetime import datetime
+from . import db
+
+
+class PushJob(db.Model):
+    """Queued push delivery for a notification, drained by the dispatch workers"""
+
+    __tablename__ = 'push_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # 'queued', 'running', 'done' or 'failed'
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+
+    total = db.Column(db.Integer, nullable=False, default=0)  # Target devices
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    # Highest user id delivered so far; a requeued job resumes after it
+    last_user_id = db.Column(db.Integer, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)  # Last committed progress
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        """Convert job progress to dictionary for JSON response"""
+        return {
+            'job_id': self.id,
+            'notification_id': self.notification_id,
+            'status': self.status,
+            'total': self.total,
+            'queued': max(self.total - self.sent - self.failed, 0),
+            'sent': self.sent,
+            'failed': self.failed,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<PushJob {self.id} ({self.status})>'
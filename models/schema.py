@@ -0,0 +1,81 @@
+from . import db
+
+
+def ensure_columns():
+    """
+    Add nullable model columns missing from existing tables
+
+    Like indexes, columns added to a model after its table was created are
+    never applied by db.create_all().
+
+    Returns:
+        List of created 'table.column' names
+    """
+    inspector = db.inspect(db.engine)
+    created = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            created.append(f'{table.name}.{column.name}')
+
+    return created
+
+
+def ensure_indexes():
+    """
+    Create any model index missing from the database
+
+    db.create_all() skips tables that already exist, so indexes added to
+    the models later never reach databases created before them.
+
+    Returns:
+        List of created index names
+    """
+    inspector = db.inspect(db.engine)
+    created = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+
+    return created
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Keep migration autogenerate away from the meal search tables
+
+    The FTS5 table and its shadow tables are managed by
+    services.search.ensure_search_index, not by the models.
+    """
+    if type_ == 'table' and reflected and compare_to is None and name.startswith('meals_fts'):
+        return False
+    return True
+
+
+def init_migrate(app):
+    """Attach Flask-Migrate to the app, importing Alembic only when needed"""
+    import os
+    from flask_migrate import Migrate
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return Migrate(app, db,
+                   directory=os.path.join(root, 'migrations'),
+                   render_as_batch=True,  # SQLite can't ALTER most things in place
+                   include_object=include_object)
@@ -1,5 +1,4 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from . import db
 
 
@@ -7,6 +6,25 @@ class User(db.Model):
     """User model for mobile app users"""
     
     __tablename__ = 'users'
+    __table_args__ = (
+        # Token lookups when pruning dead devices
+        db.Index('ix_users_fcm_token', 'fcm_token'),
+        # 'all' broadcasts: only users with a device token are indexed
+        db.Index('ix_users_with_token', 'id',
+                 sqlite_where=db.text('fcm_token IS NOT NULL'),
+                 postgresql_where=db.text('fcm_token IS NOT NULL')),
+        # Paid broadcasts: only users with a device token are indexed
+        db.Index('ix_users_paid_with_token', 'is_paid', 'id',
+                 sqlite_where=db.text('fcm_token IS NOT NULL'),
+                 postgresql_where=db.text('fcm_token IS NOT NULL')),
+        # Admin user lists, newest first, and name prefix search
+        db.Index('ix_users_created_at', 'created_at'),
+        # Paid/unpaid lists, newest first
+        db.Index('ix_users_paid_created', 'is_paid', 'created_at', 'id'),
+        db.Index('ix_users_name', 'name'),
+        # Subscription expiry job and reminders: paid users by end date
+        db.Index('ix_users_paid_until', 'is_paid', 'paid_until'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -15,14 +33,26 @@ class User(db.Model):
     is_paid = db.Column(db.Boolean, default=False)
     fcm_token = db.Column(db.String(500), nullable=True)  # Firebase Cloud Messaging token
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # End of the paid subscription (UTC); None means paid with no end date.
+    # Expired users are downgraded by services.subscriptions.expire_subscriptions
+    paid_until = db.Column(db.DateTime, nullable=True)
+    paid_reminder_sent_at = db.Column(db.DateTime, nullable=True)
+
+    # Feed position the user has seen up to: notifications at or before
+    # (notifications_seen_at, notifications_seen_id) count as read
+    notifications_seen_at = db.Column(db.DateTime, nullable=True)
+    notifications_seen_id = db.Column(db.Integer, nullable=True)
     
     def set_password(self, password):
         """Hash and set the user's password"""
-        self.password_hash = generate_password_hash(password)
+        from services.passwords import hash_password
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if the provided password matches the hash"""
-        return check_password_hash(self.password_hash, password)
+        from services.passwords import check_password
+        return check_password(self.password_hash, password)
     
     def to_dict(self):
         """Convert user to dictionary for JSON response"""
@@ -31,6 +61,7 @@ class User(db.Model):
             'name': self.name,
             'phone': self.phone,
             'is_paid': self.is_paid,
+            'paid_until': self.paid_until.isoformat() if self.paid_until else None,
             'created_at': self.created_at.isoformat()
         }
     
@@ -1,14 +1,23 @@
-import os
 from datetime import datetime
-from flask import Blueprint, request, render_template, redirect, url_for, session, flash, current_app
-from werkzeug.utils import secure_filename
+from flask import Blueprint, request, render_template, redirect, url_for, session, flash
 from functools import wraps
 from models import db
 from models.notification import Notification
 from models.user import User
 from models.meal import Meal
 from config import Config
-from services.fcm import send_notification_to_users
+from services import meal_cache
+from services.dispatch import enqueue_notification, get_notification_job
+from services.auth_cache import invalidate_user
+from services.stats import get_user_stats, invalidate_user_stats
+from services.inbox import add_notification, remove_user
+from services.subscriptions import set_paid_status, bulk_set_paid_status, parse_bulk_paid_request
+from services.unread import remove_user_reads
+from services.users import paginate_users, suggest_users
+from services.exports import export_response, ExportError
+from services.pagination import parse_limit
+from services.ratelimit import rate_limit, get_metrics
+from services.images import save_image_upload, confirm_image_upload, release_image, InvalidImageError
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -29,7 +38,19 @@ def admin_required(f):
     return decorated_function
 
 
+def login_limited(retry_after):
+    return render_template('admin/login.html', error='محاولات كثيرة، حاول مرة أخرى بعد قليل')
+
+
+def login_failed(response):
+    # A successful login redirects; a failed one renders the form again
+    return response.status_code != 302
+
+
 @admin_bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('admin_login', per_ip=Config.RATELIMIT_LOGIN_PER_IP,
+            per_account=Config.RATELIMIT_LOGIN_PER_ACCOUNT, account_field='username',
+            limited_response=login_limited, account_failed=login_failed)
 def login():
     """Admin login page"""
     if session.get('admin_logged_in'):
@@ -62,99 +83,89 @@ def logout():
 @admin_required
 def dashboard():
     """Admin dashboard with statistics"""
-    users = User.query.order_by(User.created_at.desc()).all()
-
-    total_users = len(users)
-    paid_users = len([u for u in users if u.is_paid])
-    unpaid_users = total_users - paid_users
+    stats = get_user_stats()
 
     # Get 5 most recent users
-    recent_users = [u.to_dict() for u in users[:5]]
+    recent_users = [u.to_dict() for u in User.query.order_by(User.created_at.desc()).limit(5)]
 
     # Format current date in Arabic
     current_date = datetime.now().strftime('%Y-%m-%d')
 
     return render_template('admin/dashboard.html',
                          active_page='dashboard',
-                         total_users=total_users,
-                         paid_users=paid_users,
-                         unpaid_users=unpaid_users,
+                         total_users=stats['total'],
+                         paid_users=stats['paid'],
+                         unpaid_users=stats['unpaid'],
                          recent_users=recent_users,
                          current_date=current_date,
                          success_message=request.args.get('success'),
                          error_message=request.args.get('error'))
 
 
-@admin_bp.route('/users')
-@admin_required
-def users_list():
-    """List all users with search functionality"""
-    search_phone = request.args.get('phone', '').strip()
+def list_params():
+    """Paging, sorting and search parameters shared by the user list pages"""
+    return {
+        'search': request.args.get('q', request.args.get('phone', '')).strip(),
+        'sort': request.args.get('sort', 'created_at'),
+        'order': request.args.get('order', 'desc'),
+        'page': request.args.get('page', 1, type=int),
+        'limit': parse_limit(request.args.get('limit'), Config.ADMIN_PAGE_SIZE, Config.ADMIN_MAX_PAGE_SIZE)
+    }
 
-    if search_phone:
-        users = User.query.filter(User.phone.contains(search_phone)).order_by(User.created_at.desc()).all()
-    else:
-        users = User.query.order_by(User.created_at.desc()).all()
 
-    all_users = User.query.all()
-    total = len(all_users)
-    paid_count = len([u for u in all_users if u.is_paid])
-    unpaid_count = total - paid_count
+def render_users_list(active_page, filter_type):
+    """Render one page of users.html for the given filter"""
+    params = list_params()
+    result = paginate_users(filter_type=filter_type, **params)
+    stats = get_user_stats()
 
     return render_template('admin/users.html',
-                         active_page='users',
-                         users=[u.to_dict() for u in users],
-                         total=total,
-                         paid_count=paid_count,
-                         unpaid_count=unpaid_count,
-                         search_phone=search_phone,
-                         filter_type=None,
+                         active_page=active_page,
+                         users=[u.to_dict() for u in result['users']],
+                         page=result['page'],
+                         pages=result['pages'],
+                         matching=result['total'],
+                         list_args={'q': params['search'], 'sort': params['sort'],
+                                    'order': params['order'], 'limit': params['limit']},
+                         total=stats['total'],
+                         paid_count=stats['paid'],
+                         unpaid_count=stats['unpaid'],
+                         search_phone=params['search'],
+                         filter_type=filter_type,
                          success_message=request.args.get('success'),
                          error_message=request.args.get('error'))
 
 
+@admin_bp.route('/users')
+@admin_required
+def users_list():
+    """List all users with search functionality"""
+    return render_users_list('users', None)
+
+
 @admin_bp.route('/paid-users')
 @admin_required
 def paid_users_list():
     """List only paid users"""
-    users = User.query.filter(User.is_paid == True).order_by(User.created_at.desc()).all()
-
-    all_users = User.query.all()
-    total = len(all_users)
-    paid_count = len([u for u in all_users if u.is_paid])
-    unpaid_count = total - paid_count
-
-    return render_template('admin/users.html',
-                         active_page='paid',
-                         users=[u.to_dict() for u in users],
-                         total=total,
-                         paid_count=paid_count,
-                         unpaid_count=unpaid_count,
-                         filter_type='paid',
-                         success_message=request.args.get('success'),
-                         error_message=request.args.get('error'))
+    return render_users_list('paid', 'paid')
 
 
 @admin_bp.route('/unpaid-users')
 @admin_required
 def unpaid_users_list():
     """List only unpaid users"""
-    users = User.query.filter(User.is_paid == False).order_by(User.created_at.desc()).all()
+    return render_users_list('unpaid', 'unpaid')
 
-    all_users = User.query.all()
-    total = len(all_users)
-    paid_count = len([u for u in all_users if u.is_paid])
-    unpaid_count = total - paid_count
 
-    return render_template('admin/users.html',
-                         active_page='unpaid',
-                         users=[u.to_dict() for u in users],
-                         total=total,
-                         paid_count=paid_count,
-                         unpaid_count=unpaid_count,
-                         filter_type='unpaid',
-                         success_message=request.args.get('success'),
-                         error_message=request.args.get('error'))
+@admin_bp.route('/export/<kind>')
+@admin_required
+def export(kind):
+    """Download users, notifications or meals as a streamed CSV/JSONL file"""
+    from flask import jsonify
+    try:
+        return export_response(kind, request.args)
+    except ExportError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
 
 @admin_bp.route('/users/<int:user_id>')
@@ -183,8 +194,7 @@ def make_user_paid(user_id):
     if not user:
         return redirect(url_for('admin.users_list', error='المستخدم غير موجود'))
 
-    user.is_paid = True
-    db.session.commit()
+    set_paid_status(user, True)
 
     return redirect(url_for('admin.user_detail', user_id=user_id, success=f'تم تفعيل اشتراك {user.name} بنجاح ✅'))
 
@@ -197,8 +207,7 @@ def make_user_unpaid(user_id):
     if not user:
         return redirect(url_for('admin.users_list', error='المستخدم غير موجود'))
 
-    user.is_paid = False
-    db.session.commit()
+    set_paid_status(user, False)
 
     return redirect(url_for('admin.user_detail', user_id=user_id, success=f'تم إلغاء اشتراك {user.name} ❌'))
 
@@ -214,11 +223,20 @@ def delete_user(user_id):
     user_name = user.name
 
     # Delete user's targeted notifications first
-    Notification.query.filter_by(target_user_id=user_id).delete()
+    targeted = Notification.query.filter_by(target_user_id=user_id)
+    image_paths = {n.image_path for n in targeted.filter(Notification.image_path.isnot(None))}
+    remove_user(user_id)
+    remove_user_reads(user_id)
+    targeted.delete()
 
     # Delete the user
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_stats()
+    invalidate_user(user_id)
+
+    for image_path in image_paths:
+        release_image(image_path)
 
     return redirect(url_for('admin.users_list', success=f'تم حذف {user_name} بنجاح 🗑️'))
 
@@ -228,26 +246,22 @@ def delete_user(user_id):
 def quick_manage():
     """Quick user status management page with AJAX"""
     filter_type = request.args.get('filter', 'unpaid')
-
-    if filter_type == 'paid':
-        users = User.query.filter(User.is_paid == True).order_by(User.created_at.desc()).all()
-    elif filter_type == 'unpaid':
-        users = User.query.filter(User.is_paid == False).order_by(User.created_at.desc()).all()
-    else:
-        users = User.query.order_by(User.created_at.desc()).all()
-
-    all_users = User.query.all()
-    total = len(all_users)
-    paid_count = len([u for u in all_users if u.is_paid])
-    unpaid_count = total - paid_count
+    params = list_params()
+    result = paginate_users(filter_type=filter_type if filter_type in ('paid', 'unpaid') else None, **params)
+    stats = get_user_stats()
 
     return render_template('admin/quick_manage.html',
                          active_page='quick',
-                         users=[u.to_dict() for u in users],
+                         users=[u.to_dict() for u in result['users']],
                          filter=filter_type,
-                         total=total,
-                         paid_count=paid_count,
-                         unpaid_count=unpaid_count)
+                         page=result['page'],
+                         pages=result['pages'],
+                         list_args={'filter': filter_type, 'q': params['search'], 'sort': params['sort'],
+                                    'order': params['order'], 'limit': params['limit']},
+                         search=params['search'],
+                         total=stats['total'],
+                         paid_count=stats['paid'],
+                         unpaid_count=stats['unpaid'])
 
 
 @admin_bp.route('/api/users/<int:user_id>/paid', methods=['POST'])
@@ -259,8 +273,7 @@ def api_make_user_paid(user_id):
     if not user:
         return jsonify({'success': False, 'error': 'المستخدم غير موجود'}), 404
 
-    user.is_paid = True
-    db.session.commit()
+    set_paid_status(user, True)
 
     return jsonify({
         'success': True,
@@ -278,8 +291,7 @@ def api_make_user_unpaid(user_id):
     if not user:
         return jsonify({'success': False, 'error': 'المستخدم غير موجود'}), 404
 
-    user.is_paid = False
-    db.session.commit()
+    set_paid_status(user, False)
 
     return jsonify({
         'success': True,
@@ -288,17 +300,29 @@ def api_make_user_unpaid(user_id):
     })
 
 
+@admin_bp.route('/api/users/bulk-paid', methods=['POST'])
+@admin_required
+def api_bulk_paid_status():
+    """AJAX API: Make many users paid/unpaid from ids, phones or a CSV file"""
+    from flask import jsonify
+    try:
+        user_ids, phones, is_paid, paid_until = parse_bulk_paid_request(request)
+        result = bulk_set_paid_status(user_ids, phones, is_paid, paid_until)
+    except ValueError as e:  # includes BulkRequestError and bad CSV encodings
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'message': f"تم تحديث {result['updated']} مستخدم",
+        **result
+    })
+
+
 @admin_bp.route('/notifications/new')
 @admin_required
 def create_notification():
     """Create notification page"""
-    users = User.query.order_by(User.name).all()
-
-    all_users = User.query.all()
-    total_users = len(all_users)
-    paid_users = len([u for u in all_users if u.is_paid])
-    unpaid_users = total_users - paid_users
-    users_with_token = len([u for u in all_users if u.fcm_token])
+    stats = get_user_stats()
 
     # Get preset values from query params
     preset_target = request.args.get('target')
@@ -307,11 +331,10 @@ def create_notification():
 
     return render_template('admin/create_notification.html',
                          active_page='notifications',
-                         users=[u.to_dict() for u in users],
-                         total_users=total_users,
-                         paid_users=paid_users,
-                         unpaid_users=unpaid_users,
-                         users_with_token=users_with_token,
+                         total_users=stats['total'],
+                         paid_users=stats['paid'],
+                         unpaid_users=stats['unpaid'],
+                         users_with_token=stats['with_token'],
                          preset_target=preset_target,
                          preset_user_id=preset_user_id,
                          preset_user_name=preset_user_name,
@@ -319,6 +342,19 @@ def create_notification():
                          error_message=request.args.get('error'))
 
 
+@admin_bp.route('/api/users/search')
+@admin_required
+def api_search_users():
+    """AJAX API: Type-ahead user search by name or phone prefix"""
+    from flask import jsonify
+    limit = parse_limit(request.args.get('limit'), Config.USER_SEARCH_LIMIT, Config.USER_SEARCH_MAX_LIMIT)
+    users = suggest_users(request.args.get('q', ''), limit)
+
+    response = jsonify({'success': True, 'users': users})
+    response.headers['Cache-Control'] = f'private, max-age={Config.USER_SEARCH_CACHE_TTL}'
+    return response
+
+
 @admin_bp.route('/notifications/send', methods=['POST'])
 @admin_required
 def send_notification():
@@ -350,14 +386,10 @@ def send_notification():
     # Handle image upload
     image_path = None
     if has_image_file:
-        filename = secure_filename(image_file.filename)
-        import time
-        filename = f"{int(time.time())}_{filename}"
-
-        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        image_file.save(filepath)
-        image_path = filename
+        try:
+            image_path = save_image_upload(image_file)
+        except InvalidImageError:
+            return redirect(url_for('admin.create_notification', error='الملف المرفوع ليس صورة صالحة'))
 
     # Create notification
     notification = Notification(
@@ -368,43 +400,49 @@ def send_notification():
         target_user_id=int(target_user_id) if target_type == 'specific' else None
     )
 
-    db.session.add(notification)
-    db.session.commit()
-
-    # Send push notifications
-    push_result = {'success': 0, 'failure': 0, 'total': 0}
-
+    # Save the notification and queue its push delivery in one transaction;
+    # the dispatch workers fan it out in the background
     try:
-        if target_type == 'all':
-            target_users = User.query.filter(User.fcm_token.isnot(None)).all()
-        elif target_type == 'paid':
-            target_users = User.query.filter(
-                User.is_paid == True,
-                User.fcm_token.isnot(None)
-            ).all()
-        else:  # specific
-            specific_user = User.query.get(int(target_user_id))
-            if specific_user and specific_user.fcm_token:
-                target_users = [specific_user]
-            else:
-                target_users = []
-
-        push_result['total'] = len(target_users)
-
-        if target_users:
-            push_result = send_notification_to_users(target_users, notification)
-
+        db.session.add(notification)
+        add_notification(notification)
+        job = enqueue_notification(notification)
     except Exception as e:
         print(f'Push notification error: {e}')
-        push_result = {'success': 0, 'failure': 0, 'total': 0, 'error': str(e)}
+        db.session.rollback()
+        release_image(image_path)
+        return redirect(url_for('admin.create_notification', error='تعذر حفظ الإشعار، حاول مرة أخرى'))
+    confirm_image_upload(image_file, image_path)
+
+    push_result = {'success': 0, 'failure': 0, 'total': job.total}
 
     return render_template('admin/notification_result.html',
                          success=True,
                          target_type=target_type,
                          push_result=push_result,
+                         notification_id=notification.id,
                          notification_text=text)
 
 
+@admin_bp.route('/api/notifications/<int:notification_id>/status')
+@admin_required
+def api_notification_status(notification_id):
+    """AJAX API: Push delivery progress for a notification"""
+    from flask import jsonify
+    job = get_notification_job(notification_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'لا توجد مهمة إرسال لهذا الإشعار'}), 404
+
+    return jsonify({'success': True, 'push_status': job.to_dict()})
+
+
+@admin_bp.route('/api/ratelimit/metrics')
+@admin_required
+def api_ratelimit_metrics():
+    """AJAX API: Allowed/throttled login and register attempts in this worker"""
+    from flask import jsonify
+    return jsonify({'success': True, 'metrics': get_metrics()})
+
+
 # ==================== MEALS MANAGEMENT ====================
 
 @admin_bp.route('/meals')
@@ -449,14 +487,10 @@ def create_meal():
     # Handle image upload
     image_path = None
     if image_file and image_file.filename and allowed_file(image_file.filename):
-        filename = secure_filename(image_file.filename)
-        import time
-        filename = f"{int(time.time())}_{filename}"
-
-        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        image_file.save(filepath)
-        image_path = filename
+        try:
+            image_path = save_image_upload(image_file)
+        except InvalidImageError:
+            return redirect(url_for('admin.create_meal_page', error='الملف المرفوع ليس صورة صالحة'))
 
     # Create meal
     meal = Meal(
@@ -469,6 +503,8 @@ def create_meal():
 
     db.session.add(meal)
     db.session.commit()
+    confirm_image_upload(image_file, image_path)
+    meal_cache.invalidate()
 
     return redirect(url_for('admin.meals_list', success=f'تم إضافة الوجبة "{title}" بنجاح ✅'))
 
@@ -483,16 +519,13 @@ def delete_meal(meal_id):
 
     meal_title = meal.title
 
-    # Delete the image file if it exists
-    if meal.image_path:
-        try:
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], meal.image_path)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        except Exception as e:
-            print(f'Error deleting meal image: {e}')
+    image_path = meal.image_path
 
     db.session.delete(meal)
     db.session.commit()
+    meal_cache.invalidate()
+
+    # Remove the image file and its variants unless something else still uses them
+    release_image(image_path)
 
     return redirect(url_for('admin.meals_list', success=f'تم حذف الوجبة "{meal_title}" بنجاح 🗑️'))
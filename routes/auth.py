@@ -1,12 +1,19 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import or_
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models import db
 from models.user import User
+from config import Config
+from services.auth_cache import get_user_state
+from services.inbox import add_user
+from services.ratelimit import rate_limit
+from services.passwords import verify_password, needs_rehash, PasswordBusyError
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit('register', per_ip=Config.RATELIMIT_REGISTER_PER_IP)
 def register():
     """
     Register a new user
@@ -41,6 +48,7 @@ def register():
     user.set_password(password)
     
     db.session.add(user)
+    add_user(user)
     db.session.commit()
     
     return jsonify({
@@ -51,6 +59,8 @@ def register():
 
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('login', per_ip=Config.RATELIMIT_LOGIN_PER_IP,
+            per_account=Config.RATELIMIT_LOGIN_PER_ACCOUNT, account_field='phone')
 def login():
     """
     Login user
@@ -75,8 +85,21 @@ def login():
     # Find user by phone
     user = User.query.filter_by(phone=phone).first()
     
-    if not user or not user.check_password(password):
+    if not user:
+        return jsonify({'error': 'Invalid phone or password'}), 401
+
+    try:
+        valid = verify_password(user.password_hash, password)
+    except PasswordBusyError:
+        return jsonify({'error': 'Too many login attempts, please retry shortly'}), 503, {'Retry-After': '2'}
+
+    if not valid:
         return jsonify({'error': 'Invalid phone or password'}), 401
+
+    # Upgrade hashes made with an older algorithm or cost
+    if needs_rehash(user.password_hash):
+        user.set_password(password)
+        db.session.commit()
     
     # Create JWT token
     access_token = create_access_token(
@@ -108,12 +131,14 @@ def save_device_token():
         return jsonify({'error': 'fcm_token is required'}), 400
     
     user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    
-    if not user:
+    if not get_user_state(user_id):
         return jsonify({'error': 'User not found'}), 404
     
-    user.fcm_token = data['fcm_token']
+    # Apps re-register on every launch; only write when the token changed
+    User.query.filter(
+        User.id == user_id,
+        or_(User.fcm_token.is_(None), User.fcm_token != data['fcm_token'])
+    ).update({User.fcm_token: data['fcm_token']}, synchronize_session=False)
     db.session.commit()
     
     return jsonify({
@@ -139,8 +164,8 @@ def get_current_user():
         # Get user ID from JWT token
         current_user_id = int(get_jwt_identity())
 
-        # Fetch user from database
-        user = User.query.get(current_user_id)
+        # Cached auth state, falling back to the database
+        user = get_user_state(current_user_id)
 
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -148,10 +173,10 @@ def get_current_user():
         # Return user data
         return jsonify({
             'user': {
-                'id': user.id,
-                'name': user.name,
-                'phone': user.phone,
-                'is_paid': user.is_paid
+                'id': user['id'],
+                'name': user['name'],
+                'phone': user['phone'],
+                'is_paid': user['is_paid']
             }
         }), 200
 
@@ -1,12 +1,17 @@
-import os
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt
-from werkzeug.utils import secure_filename
 from models import db
 from models.notification import Notification
 from models.user import User
 from config import Config
-from services.fcm import send_notification_to_users
+from services.dispatch import enqueue_notification, get_notification_job
+from services.inbox import add_notification
+from services.subscriptions import set_paid_status, bulk_set_paid_status, parse_bulk_paid_request, parse_paid_until
+from services.images import save_image_upload, confirm_image_upload, release_image, InvalidImageError
+from services.users import paginate_users
+from services.exports import export_response, ExportError
+from services.pagination import parse_limit
+from services.ratelimit import rate_limit
 
 coach_bp = Blueprint('coach', __name__, url_prefix='/api/coach')
 
@@ -18,6 +23,8 @@ def allowed_file(filename):
 
 
 @coach_bp.route('/login', methods=['POST'])
+@rate_limit('coach_login', per_ip=Config.RATELIMIT_LOGIN_PER_IP,
+            per_account=Config.RATELIMIT_LOGIN_PER_ACCOUNT, account_field='username')
 def coach_login():
     """
     Login as coach
@@ -115,18 +122,10 @@ def create_notification():
     # Handle image upload
     image_path = None
     if image_file and allowed_file(image_file.filename):
-        filename = secure_filename(image_file.filename)
-        # Add timestamp to filename to avoid conflicts
-        import time
-        filename = f"{int(time.time())}_{filename}"
-        
-        # Ensure upload folder exists
-        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        # Save the file
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        image_file.save(filepath)
-        image_path = filename
+        try:
+            image_path = save_image_upload(image_file)
+        except InvalidImageError as e:
+            return jsonify({'error': str(e)}), 400
     
     # Create notification
     notification = Notification(
@@ -137,47 +136,80 @@ def create_notification():
         target_user_id=int(target_user_id) if target_type == 'specific' else None
     )
     
-    db.session.add(notification)
-    db.session.commit()
-    
-    # Send push notifications to target users
-    push_result = {'success': 0, 'failure': 0}
+    # Save the notification and queue its push delivery in one transaction;
+    # the dispatch workers fan it out in the background
     try:
-        if target_type == 'all':
-            target_users = User.query.filter(User.fcm_token.isnot(None)).all()
-        elif target_type == 'paid':
-            target_users = User.query.filter(User.is_paid == True, User.fcm_token.isnot(None)).all()
-        else:  # specific
-            target_users = [User.query.get(int(target_user_id))]
-        
-        if target_users:
-            push_result = send_notification_to_users(target_users, notification)
+        db.session.add(notification)
+        add_notification(notification)
+        job = enqueue_notification(notification)
     except Exception as e:
         print(f'Push notification error: {e}')
+        db.session.rollback()
+        release_image(image_path)
+        return jsonify({'error': 'Could not save the notification and queue its push, please retry'}), 500
+    confirm_image_upload(image_file, image_path)
     
     return jsonify({
-        'message': 'Notification created successfully',
+        'message': 'Notification created, push delivery queued',
         'notification_id': notification.id,
+        'job_id': job.id,
         'notification': notification.to_dict(request.host_url.rstrip('/')),
-        'push_result': push_result
-    }), 201
+        'push_status': job.to_dict()
+    }), 202
+
+
+@coach_bp.route('/notifications/<int:notification_id>/status', methods=['GET'])
+@jwt_required()
+def notification_status(notification_id):
+    """
+    Get push delivery progress for a notification (coach only)
+    """
+    # Verify the request is from a coach
+    claims = get_jwt()
+    if claims.get('type') != 'coach':
+        return jsonify({'error': 'Coach authorization required'}), 403
+    
+    job = get_notification_job(notification_id)
+    if not job:
+        return jsonify({'error': 'No push job found for this notification'}), 404
+    
+    return jsonify({'push_status': job.to_dict()}), 200
 
 
 @coach_bp.route('/users', methods=['GET'])
 @jwt_required()
 def list_users():
     """
-    List all users (coach only) - useful for selecting specific users for notifications
+    List users (coach only) - useful for selecting specific users for notifications
+    
+    Query params (all optional):
+    - page: Page number (default 1)
+    - limit: Page size (default 50, max 200)
+    - q: Phone number or name prefix
+    - filter: "paid" | "unpaid"
+    - sort: "created_at" | "name" | "phone" | "id" (default created_at)
+    - order: "asc" | "desc" (default desc)
     """
     # Verify the request is from a coach
     claims = get_jwt()
     if claims.get('type') != 'coach':
         return jsonify({'error': 'Coach authorization required'}), 403
     
-    users = User.query.all()
+    result = paginate_users(
+        filter_type=request.args.get('filter'),
+        search=request.args.get('q'),
+        sort=request.args.get('sort', 'created_at'),
+        order=request.args.get('order', 'desc'),
+        page=request.args.get('page', 1, type=int),
+        limit=parse_limit(request.args.get('limit'), Config.ADMIN_PAGE_SIZE, Config.ADMIN_MAX_PAGE_SIZE)
+    )
+    
     return jsonify({
-        'users': [user.to_dict() for user in users],
-        'total': len(users)
+        'users': [user.to_dict() for user in result['users']],
+        'total': result['total'],
+        'page': result['page'],
+        'limit': result['limit'],
+        'pages': result['pages']
     }), 200
 
 
@@ -189,8 +221,11 @@ def update_user_paid_status(user_id):
     
     Request body:
     {
-        "is_paid": true | false
+        "is_paid": true | false,
+        "paid_until": "2026-12-31"  // Optional ISO date/datetime (UTC), paid users only
     }
+
+    The user is downgraded automatically once paid_until passes.
     """
     # Verify the request is from a coach
     claims = get_jwt()
@@ -201,14 +236,77 @@ def update_user_paid_status(user_id):
     if not data or 'is_paid' not in data:
         return jsonify({'error': 'is_paid field is required'}), 400
     
+    try:
+        paid_until = parse_paid_until(data.get('paid_until'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     user = User.query.get(user_id)
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    user.is_paid = bool(data['is_paid'])
-    db.session.commit()
+    set_paid_status(user, data['is_paid'], paid_until)
     
     return jsonify({
         'message': 'User paid status updated',
         'user': user.to_dict()
     }), 200
+
+
+@coach_bp.route('/users/paid', methods=['POST'])
+@jwt_required()
+def bulk_update_paid_status():
+    """
+    Set the paid status of many users at once (coach only)
+
+    Request body (JSON):
+    {
+        "is_paid": true | false,
+        "paid_until": "2026-12-31",    // optional, renews every matched user
+        "user_ids": [1, 2, 3],         // optional
+        "phones": ["01234567890"]      // optional
+    }
+
+    Or multipart/form-data with "is_paid" (and optional "paid_until")
+    fields and a "file" CSV whose header names an "id" and/or "phone" column.
+
+    All changes are applied in one transaction; each id/phone gets a
+    status of "updated", "unchanged" or "not_found".
+    """
+    claims = get_jwt()
+    if claims.get('type') != 'coach':
+        return jsonify({'error': 'Coach authorization required'}), 403
+
+    try:
+        user_ids, phones, is_paid, paid_until = parse_bulk_paid_request(request)
+        result = bulk_set_paid_status(user_ids, phones, is_paid, paid_until)
+    except ValueError as e:  # includes BulkRequestError and bad CSV encodings
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(result), 200
+
+
+@coach_bp.route('/export/<kind>', methods=['GET'])
+@jwt_required()
+def export(kind):
+    """
+    Download users, notifications or meals as CSV or JSONL (coach only)
+
+    The file is streamed in chunks, so exports of any size use constant memory.
+
+    Query params (all optional):
+    - format: "csv" | "jsonl" (default csv)
+    - created_from, created_to: ISO date or datetime
+    - filter: "paid" | "unpaid" (users)
+    - has_token: true | false (users)
+    - target_type: "all" | "paid" | "specific" (notifications)
+    - category: Meal category (meals)
+    """
+    claims = get_jwt()
+    if claims.get('type') != 'coach':
+        return jsonify({'error': 'Coach authorization required'}), 403
+
+    try:
+        return export_response(kind, request.args)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
@@ -1,12 +1,11 @@
-import os
-import time
 from flask import Blueprint, request, jsonify, current_app, render_template
 from flask_jwt_extended import jwt_required, get_jwt
-from werkzeug.utils import secure_filename
-from sqlalchemy import or_, and_
 from models import db
 from models.meal import Meal
 from config import Config
+from services import meal_cache, search
+from services.pagination import parse_limit
+from services.images import save_image_upload, confirm_image_upload, release_image, InvalidImageError
 
 meals_bp = Blueprint('meals', __name__, url_prefix='/api/meals')
 
@@ -17,26 +16,30 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
 
+def cached_json_response(body, etag):
+    """JSON response with a strong ETag, answering If-None-Match with 304"""
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 @meals_bp.route('', methods=['GET'])
 def get_all_meals():
     """
     Get all meals
     Returns all meals ordered by creation date (newest first)
     Optional query param: ?category=breakfast|lunch|dinner|snacks
+
+    Served from the in-process catalog cache with an ETag; send
+    If-None-Match to get 304 when nothing changed.
     """
     category = request.args.get('category')
-
-    if category:
-        meals = Meal.query.filter_by(category=category).order_by(Meal.created_at.desc()).all()
-    else:
-        meals = Meal.query.order_by(Meal.created_at.desc()).all()
-
     base_url = request.host_url.rstrip('/')
 
-    return jsonify({
-        'meals': [meal.to_dict(base_url) for meal in meals],
-        'total': len(meals)
-    }), 200
+    body, etag = meal_cache.get_catalog(category, base_url)
+    return cached_json_response(body, etag)
 
 
 @meals_bp.route('/<int:meal_id>', methods=['GET'])
@@ -44,12 +47,13 @@ def get_meal(meal_id):
     """
     Get a single meal by ID
     """
-    meal = Meal.query.get(meal_id)
-    if not meal:
+    base_url = request.host_url.rstrip('/')
+
+    cached = meal_cache.get_meal(meal_id, base_url)
+    if not cached:
         return jsonify({'error': 'Meal not found'}), 404
 
-    base_url = request.host_url.rstrip('/')
-    return jsonify({'meal': meal.to_dict(base_url)}), 200
+    return cached_json_response(*cached)
 
 
 @meals_bp.route('', methods=['POST'])
@@ -93,17 +97,10 @@ def create_meal():
     # Handle image upload
     image_path = None
     if image_file and allowed_file(image_file.filename):
-        filename = secure_filename(image_file.filename)
-        # Add timestamp to filename to avoid conflicts
-        filename = f"{int(time.time())}_{filename}"
-
-        # Ensure upload folder exists
-        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-        # Save the file
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        image_file.save(filepath)
-        image_path = filename
+        try:
+            image_path = save_image_upload(image_file)
+        except InvalidImageError as e:
+            return jsonify({'error': str(e)}), 400
 
     # Create meal
     meal = Meal(
@@ -116,6 +113,8 @@ def create_meal():
 
     db.session.add(meal)
     db.session.commit()
+    confirm_image_upload(image_file, image_path)
+    meal_cache.invalidate()
 
     return jsonify({
         'message': 'Meal created successfully',
@@ -131,8 +130,12 @@ def search_meals():
     Query params:
     - query: The search term (ingredient name, e.g., "فول")
     - category: Optional filter by category (breakfast, lunch, dinner, snacks)
+    - limit: Page size (default 20, max 100)
+    - offset: Number of results to skip
 
-    Returns all meals where title or description contains the search term
+    Returns meals whose title or description contains every word of the
+    search term (Arabic diacritics and letter variants are ignored), best
+    matches first
     """
     query = request.args.get('query', '').strip()
     category = request.args.get('category')
@@ -140,27 +143,20 @@ def search_meals():
     if not query:
         return jsonify({'error': 'Search query is required'}), 400
 
-    # Build the search query - search in title and description
-    search_filter = or_(
-        Meal.title.ilike(f'%{query}%'),
-        Meal.description.ilike(f'%{query}%')
-    )
+    limit = parse_limit(request.args.get('limit'),
+                        Config.MEAL_SEARCH_PAGE_SIZE,
+                        Config.MEAL_SEARCH_MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
 
-    if category:
-        meals = Meal.query.filter(
-            and_(
-                Meal.category == category,
-                search_filter
-            )
-        ).order_by(Meal.created_at.desc()).all()
-    else:
-        meals = Meal.query.filter(search_filter).order_by(Meal.created_at.desc()).all()
+    meals, total = search.search_meals(query, category, limit, offset)
 
     base_url = request.host_url.rstrip('/')
 
     return jsonify({
         'meals': [meal.to_dict(base_url) for meal in meals],
-        'total': len(meals),
+        'total': total,
+        'limit': limit,
+        'offset': offset,
         'query': query,
         'category': category
     }), 200
@@ -181,16 +177,13 @@ def delete_meal(meal_id):
     if not meal:
         return jsonify({'error': 'Meal not found'}), 404
 
-    # Delete the image file if it exists
-    if meal.image_path:
-        try:
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], meal.image_path)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        except Exception as e:
-            print(f'Error deleting meal image: {e}')
+    image_path = meal.image_path
 
     db.session.delete(meal)
     db.session.commit()
+    meal_cache.invalidate()
+
+    # Remove the image file and its variants unless something else still uses them
+    release_image(image_path)
 
     return jsonify({'message': 'Meal deleted successfully'}), 200
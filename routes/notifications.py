@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from sqlalchemy import or_, and_
-from models.notification import Notification
 from models.user import User
+from config import Config
+from services.auth_cache import get_user_state
+from services.feed import load_feed
+from services.unread import unread_count, advance_seen, mark_seen, mark_read
+from services.pagination import encode_cursor, decode_cursor, parse_limit
 
 notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
 
@@ -12,55 +15,138 @@ notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notific
 def get_notifications():
     """
     Get notifications for the authenticated user
-    
+
     Returns notifications that:
     - target_type is 'all' (for everyone)
     - target_type is 'paid' and user.is_paid is True
     - target_type is 'specific' and target_user_id matches user's id
+
+    Query params (all optional):
+    - limit: Page size (default 50, max 100)
+    - cursor: next_cursor from a previous page, to fetch older items
+    - since: sync_cursor from a previous response, to fetch only newer items
+
+    Results are ordered newest first and paginated by (created_at, id).
+    Reading the newest page (no cursor) marks it as seen for the unread count.
+    With NOTIFICATION_INBOX enabled the feed is read from the user's
+    precomputed inbox instead of evaluating the targeting rules.
     """
     # Verify the request is from a user (not coach)
     claims = get_jwt()
     if claims.get('type') != 'user':
         return jsonify({'error': 'User authorization required'}), 403
-    
+
     user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-    
+    user = get_user_state(user_id)
+
     if not user:
         return jsonify({'error': 'User not found'}), 404
-    
-    # Build query for user's notifications
-    # 1. All notifications targeted to everyone
-    # 2. Paid notifications if user is paid
-    # 3. Specific notifications for this user
-    
-    if user.is_paid:
-        # Paid users see: all, paid, and their specific notifications
-        notifications = Notification.query.filter(
-            or_(
-                Notification.target_type == 'all',
-                Notification.target_type == 'paid',
-                and_(
-                    Notification.target_type == 'specific',
-                    Notification.target_user_id == user_id
-                )
-            )
-        ).order_by(Notification.created_at.desc()).all()
+
+    limit = parse_limit(request.args.get('limit'),
+                        Config.NOTIFICATIONS_PAGE_SIZE,
+                        Config.NOTIFICATIONS_MAX_PAGE_SIZE)
+    try:
+        cursor = request.args.get('cursor')
+        cursor = decode_cursor(cursor) if cursor else None
+        since = request.args.get('since')
+        since = decode_cursor(since) if since else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    notifications = load_feed(user_id, user['is_paid'], cursor, since, limit + 1)
+
+    has_more = len(notifications) > limit
+    notifications = notifications[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = notifications[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    # Position of the newest item the client has seen, to pass back as ?since=.
+    # Showing it also counts as seeing it, which keeps the push badge in step
+    # for clients that don't call POST /read
+    if notifications and not cursor:
+        sync_cursor = encode_cursor(notifications[0].created_at, notifications[0].id)
+        advance_seen(user, (notifications[0].created_at, notifications[0].id))
     else:
-        # Free users see: all and their specific notifications
-        notifications = Notification.query.filter(
-            or_(
-                Notification.target_type == 'all',
-                and_(
-                    Notification.target_type == 'specific',
-                    Notification.target_user_id == user_id
-                )
-            )
-        ).order_by(Notification.created_at.desc()).all()
-    
+        sync_cursor = request.args.get('since')
+
     base_url = request.host_url.rstrip('/')
-    
+
     return jsonify({
         'notifications': [n.to_dict(base_url) for n in notifications],
-        'total': len(notifications)
+        'total': len(notifications),
+        'next_cursor': next_cursor,
+        'sync_cursor': sync_cursor
     }), 200
+
+
+def _current_user():
+    """The authenticated app user, or an error response"""
+    claims = get_jwt()
+    if claims.get('type') != 'user':
+        return None, (jsonify({'error': 'User authorization required'}), 403)
+
+    user = User.query.get(int(get_jwt_identity()))
+    if not user:
+        return None, (jsonify({'error': 'User not found'}), 404)
+
+    return user, None
+
+
+@notifications_bp.route('/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_count():
+    """
+    Number of notifications the user hasn't seen or read
+
+    A notification is unread when it is newer than both the newest feed
+    page the user was shown and the position passed to POST /read, and
+    hasn't been acknowledged individually.
+    """
+    claims = get_jwt()
+    if claims.get('type') != 'user':
+        return jsonify({'error': 'User authorization required'}), 403
+
+    user = get_user_state(int(get_jwt_identity()))
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    return jsonify({'unread_count': unread_count(user['id'])}), 200
+
+
+@notifications_bp.route('/read', methods=['POST'])
+@jwt_required()
+def mark_notifications_read():
+    """
+    Mark notifications as read
+
+    Request body (any combination):
+    {
+        "ids": [1, 2, 3],         // acknowledge these notifications
+        "cursor": "<sync_cursor>", // everything up to this feed position
+        "all": true                // everything currently in the feed
+    }
+    """
+    user, error = _current_user()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') or []
+    if not isinstance(ids, list):
+        return jsonify({'error': 'ids must be a list'}), 400
+
+    try:
+        position = decode_cursor(data['cursor']) if data.get('cursor') else None
+        ids = [int(i) for i in ids]
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if data.get('all') or position:
+        mark_seen(user, None if data.get('all') else position)
+    if ids:
+        mark_read(user, ids)
+
+    return jsonify({'unread_count': unread_count(user.id)}), 200
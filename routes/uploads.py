@@ -0,0 +1,67 @@
+import os
+import re
+from flask import Blueprint, current_app, abort, redirect, send_from_directory
+from werkzeug.security import safe_join
+from config import Config
+from services.storage import get_storage
+
+uploads_bp = Blueprint('uploads', __name__, url_prefix='/uploads')
+
+# ab/cd/<sha256>.<ext> and its _thumb/_medium variants never change once written
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64}(?:_[a-z]+)?)\.[a-z0-9]+$')
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+@uploads_bp.route('/<path:filename>')
+def uploaded_file(filename):
+    """
+    Serve an uploaded image
+
+    Content-addressed files get a strong ETag derived from their hash and
+    an immutable, far-future Cache-Control. Range and conditional requests
+    are answered by send_file. With UPLOADS_ACCEL_REDIRECT set, the bytes
+    are handed off to nginx through X-Accel-Redirect instead. With a remote
+    storage backend the client is redirected to the object's URL.
+    """
+    match = CONTENT_ADDRESSED.match(filename)
+    etag = match.group(1) if match else None
+
+    # Legacy timestamp-named uploads may in theory be replaced, so cache them briefly
+    max_age = ONE_YEAR if etag else Config.UPLOADS_LEGACY_MAX_AGE
+
+    storage = get_storage()
+    remote_url = storage.url(filename)
+    if remote_url:
+        response = redirect(remote_url)
+        if Config.S3_PUBLIC_URL:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        else:
+            # Presigned URLs expire, so the redirect may only be reused while it is valid
+            response.cache_control.private = True
+            response.cache_control.max_age = min(max_age, Config.S3_PRESIGN_EXPIRES // 2)
+        return response
+
+    folder = storage.root
+    if Config.UPLOADS_ACCEL_REDIRECT:
+        filepath = safe_join(folder, filename)
+        if not filepath or not os.path.isfile(filepath):
+            abort(404)
+
+        response = current_app.response_class()
+        response.headers['X-Accel-Redirect'] = Config.UPLOADS_ACCEL_REDIRECT.rstrip('/') + '/' + filename
+        # Let nginx pick the Content-Type from the file extension
+        del response.headers['Content-Type']
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        if etag:
+            response.set_etag(etag)
+    else:
+        # Honors USE_X_SENDFILE, which offloads the bytes to Apache/lighttpd
+        response = send_from_directory(folder, filename, etag=etag or True, max_age=max_age, conditional=True)
+
+    if etag:
+        response.cache_control.immutable = True
+
+    return response
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from models import db
+from models.user import User
+from config import Config
+
+_states = OrderedDict()
+_lock = threading.Lock()
+MAX_STATE_ENTRIES = 10000
+
+
+def get_user_state(user_id):
+    """
+    Auth state of a user for hot authenticated endpoints
+
+    Cached in-process (LRU, AUTH_CACHE_TTL seconds) so most requests skip
+    the users table entirely. Missing users are not cached.
+
+    Returns:
+        dict with id, name, phone, is_paid and seen_position (the
+        (created_at, id) feed position the user has seen up to, or None),
+        or None if the user doesn't exist
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _states.get(user_id)
+        if entry and entry[0] > now:
+            _states.move_to_end(user_id)
+            return entry[1]
+
+    row = db.session.query(User.id, User.name, User.phone, User.is_paid,
+                           User.notifications_seen_at, User.notifications_seen_id) \
+        .filter(User.id == user_id).first()
+    if row is None:
+        return None
+
+    state = {
+        'id': row.id, 'name': row.name, 'phone': row.phone, 'is_paid': bool(row.is_paid),
+        'seen_position': (row.notifications_seen_at, row.notifications_seen_id or 0)
+        if row.notifications_seen_at else None
+    }
+
+    with _lock:
+        _states[user_id] = (now + Config.AUTH_CACHE_TTL, state)
+        _states.move_to_end(user_id)
+        while len(_states) > MAX_STATE_ENTRIES:
+            _states.popitem(last=False)
+
+    return state
+
+
+def note_seen(user_id, position):
+    """
+    Record a newer seen position in the cached state
+
+    Positions only move forward, so a cached one is never ahead of the
+    database and can be used to skip writes that would change nothing.
+    """
+    with _lock:
+        entry = _states.get(user_id)
+        if entry:
+            current = entry[1]['seen_position']
+            if current is None or tuple(position) > current:
+                entry[1]['seen_position'] = tuple(position)
+
+
+def invalidate_user(user_id):
+    """Forget a user's cached state; call after changing their paid status or deleting them"""
+    with _lock:
+        _states.pop(user_id, None)
+
+
+def invalidate_users(user_ids):
+    with _lock:
+        for user_id in user_ids:
+            _states.pop(user_id, None)
+
+
+def invalidate_all():
+    with _lock:
+        _states.clear()
@@ -0,0 +1,192 @@
+import threading
+from datetime import datetime, timedelta
+from models import db
+from models.notification import Notification
+from models.push_job import PushJob
+from models.user import User
+from config import Config
+from services.fcm import send_notification_to_users
+
+# Wakes idle workers as soon as a job is enqueued instead of waiting for the next poll
+_wakeup = threading.Event()
+_workers = []
+
+
+def target_users_query(notification):
+    """Query (id, fcm_token) rows for the devices a notification should reach"""
+    query = db.session.query(User.id, User.fcm_token).filter(User.fcm_token.isnot(None))
+
+    if notification.target_type == 'paid':
+        query = query.filter(User.is_paid == True)
+    elif notification.target_type == 'specific':
+        query = query.filter(User.id == notification.target_user_id)
+
+    return query
+
+
+def enqueue_notification(notification):
+    """
+    Queue push delivery for a notification
+
+    The job is committed together with anything pending in the session,
+    so a notification added but not yet committed is saved in the same
+    transaction and never exists without its push. An idle worker is
+    then woken up.
+
+    Returns:
+        PushJob
+    """
+    db.session.flush()
+    job = PushJob(
+        notification_id=notification.id,
+        status='queued',
+        total=target_users_query(notification).count()
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _wakeup.set()
+    return job
+
+
+def get_notification_job(notification_id):
+    """Latest push job for a notification, or None"""
+    return PushJob.query.filter_by(notification_id=notification_id) \
+        .order_by(PushJob.id.desc()).first()
+
+
+def _claim_next_job():
+    """Atomically move the oldest queued job to 'running', returning its id"""
+    while True:
+        job_id = db.session.query(PushJob.id).filter(PushJob.status == 'queued') \
+            .order_by(PushJob.id).limit(1).scalar()
+        if job_id is None:
+            return None
+
+        # Only one worker (thread or process) wins the conditional update
+        now = datetime.utcnow()
+        claimed = PushJob.query.filter(PushJob.id == job_id, PushJob.status == 'queued').update(
+            {'status': 'running', 'started_at': now, 'updated_at': now},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if claimed:
+            return job_id
+
+
+def requeue_stale_jobs():
+    """
+    Return jobs left 'running' by a crashed worker to the queue
+
+    A job is stale once it has gone PUSH_JOB_TIMEOUT without committing
+    progress. Its counters and last_user_id are kept, so whichever worker
+    claims it next carries on after the last delivered chunk.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=Config.PUSH_JOB_TIMEOUT)
+    last_progress = db.func.coalesce(PushJob.updated_at, PushJob.started_at)
+    count = PushJob.query.filter(PushJob.status == 'running', last_progress < cutoff).update(
+        {'status': 'queued'},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+
+def process_job(job_id):
+    """
+    Deliver a claimed job in chunks of target users, committing progress after each
+
+    Starts after job.last_user_id, so a requeued job does not push again
+    to the devices an earlier attempt already reached.
+    """
+    job = PushJob.query.get(job_id)
+    notification = Notification.query.get(job.notification_id)
+
+    try:
+        if not notification:
+            raise ValueError(f'Notification {job.notification_id} no longer exists')
+
+        # Targets may have changed since the job was queued (paid status,
+        # tokens), so count what this attempt will actually deliver to
+        last_id = job.last_user_id or 0
+        job.total = job.sent + job.failed + \
+            target_users_query(notification).filter(User.id > last_id).count()
+        db.session.commit()
+
+        while True:
+            rows = target_users_query(notification).filter(User.id > last_id) \
+                .order_by(User.id).limit(Config.PUSH_JOB_CHUNK_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            result = send_notification_to_users(rows, notification)
+            job.sent += result.get('success', 0)
+            job.failed += result.get('failure', 0)
+            job.last_user_id = last_id
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+
+        # Users who gain or lose eligibility mid-delivery shift the count
+        job.total = job.sent + job.failed
+        job.status = 'done'
+    except Exception as e:
+        print(f'Push job {job_id} error: {e}')
+        db.session.rollback()
+        job = PushJob.query.get(job_id)
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def run_pending_jobs():
+    """Drain the queue once, returning the number of jobs processed"""
+    processed = 0
+    while True:
+        job_id = _claim_next_job()
+        if job_id is None:
+            return processed
+        process_job(job_id)
+        processed += 1
+
+
+def _worker_loop(app, stop_event):
+    while not stop_event.is_set():
+        try:
+            with app.app_context():
+                requeue_stale_jobs()
+                run_pending_jobs()
+                db.session.remove()
+        except Exception as e:
+            print(f'Push worker error: {e}')
+
+        _wakeup.wait(Config.PUSH_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def run_worker(app, stop_event=None):
+    """Run a dispatch loop in the current thread (used by `flask push-worker`)"""
+    _worker_loop(app, stop_event or threading.Event())
+
+
+def start_workers(app, count=None):
+    """Start background dispatch threads inside this process"""
+    count = Config.PUSH_WORKER_THREADS if count is None else count
+    if count <= 0 or _workers:
+        return _workers
+
+    stop_event = threading.Event()
+    for i in range(count):
+        thread = threading.Thread(
+            target=_worker_loop,
+            args=(app, stop_event),
+            name=f'push-dispatch-{i}',
+            daemon=True
+        )
+        thread.start()
+        _workers.append(thread)
+
+    return _workers
@@ -0,0 +1,212 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from flask import Response, stream_with_context
+from models import db
+from models.meal import Meal
+from models.notification import Notification
+from models.user import User
+from config import Config
+
+# Exportable tables: output column name -> column expression. Tokens and
+# password hashes are never exported.
+EXPORT_COLUMNS = {
+    'users': {
+        'id': User.id,
+        'name': User.name,
+        'phone': User.phone,
+        'is_paid': User.is_paid,
+        'paid_until': User.paid_until,
+        'has_token': db.type_coerce(User.fcm_token.isnot(None), db.Boolean),
+        'created_at': User.created_at,
+    },
+    'notifications': {
+        'id': Notification.id,
+        'text': Notification.text,
+        'image_path': Notification.image_path,
+        'image_url': Notification.image_url,
+        'target_type': Notification.target_type,
+        'target_user_id': Notification.target_user_id,
+        'created_at': Notification.created_at,
+    },
+    'meals': {
+        'id': Meal.id,
+        'title': Meal.title,
+        'description': Meal.description,
+        'category': Meal.category,
+        'link': Meal.link,
+        'image_path': Meal.image_path,
+        'created_at': Meal.created_at,
+    },
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Leading characters that make spreadsheet apps evaluate a cell as a formula
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+_TRUE = ('1', 'true', 'yes')
+_FALSE = ('0', 'false', 'no')
+
+
+class ExportError(ValueError):
+    """Raised for an unknown export, format or filter value"""
+
+
+def _parse_time(name, value, end=False):
+    """ISO date/datetime filter; a date used as an upper bound includes that whole day"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name} must be an ISO 8601 date or datetime')
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.replace(tzinfo=None)
+
+
+def _parse_flag(name, value):
+    value = str(value).lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ExportError(f'{name} must be true or false')
+
+
+def build_export_query(kind, filters=None):
+    """
+    Column query for an export, ordered by id
+
+    Args:
+        kind: 'users', 'notifications' or 'meals'
+        filters: Mapping (e.g. request.args) with any of
+            created_from / created_to: ISO date or datetime
+            filter: 'paid' | 'unpaid' (users)
+            has_token: true | false (users)
+            target_type: 'all' | 'paid' | 'specific' (notifications)
+            category: meal category (meals)
+
+    Raises:
+        ExportError for unknown kinds or invalid filter values
+    """
+    if kind not in EXPORT_COLUMNS:
+        raise ExportError(f'Unknown export "{kind}", expected one of: {", ".join(EXPORT_COLUMNS)}')
+
+    filters = filters or {}
+    columns = EXPORT_COLUMNS[kind]
+    model = columns['id'].class_
+    query = db.session.query(*[column.label(name) for name, column in columns.items()])
+
+    if filters.get('created_from'):
+        query = query.filter(model.created_at >= _parse_time('created_from', filters['created_from']))
+    if filters.get('created_to'):
+        query = query.filter(model.created_at < _parse_time('created_to', filters['created_to'], end=True))
+
+    if kind == 'users':
+        if filters.get('filter') == 'paid':
+            query = query.filter(User.is_paid == True)
+        elif filters.get('filter') == 'unpaid':
+            query = query.filter(User.is_paid == False)
+        elif filters.get('filter'):
+            raise ExportError('filter must be "paid" or "unpaid"')
+
+        if filters.get('has_token') not in (None, ''):
+            if _parse_flag('has_token', filters['has_token']):
+                query = query.filter(User.fcm_token.isnot(None))
+            else:
+                query = query.filter(User.fcm_token.is_(None))
+
+    elif kind == 'notifications' and filters.get('target_type'):
+        query = query.filter(Notification.target_type == filters['target_type'])
+
+    elif kind == 'meals' and filters.get('category'):
+        query = query.filter(Meal.category == filters['category'])
+
+    return query.order_by(model.id)
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES) and not value.lstrip('+-').isdigit():
+        return "'" + value
+    return value
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_export(query, fmt='csv', batch_size=None):
+    """
+    Generate an export as text chunks, holding one batch of rows at a time
+
+    Rows are fetched with yield_per, which uses a server-side cursor on
+    Postgres, so memory stays flat however many rows match.
+
+    Args:
+        query: Query from build_export_query
+        fmt: 'csv' or 'jsonl'
+        batch_size: Rows fetched and written per chunk
+
+    Raises:
+        ExportError for an unknown format (before anything is generated)
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f'format must be one of: {", ".join(FORMATS)}')
+    return _generate(query, fmt, batch_size or Config.EXPORT_BATCH_SIZE)
+
+
+def _generate(query, fmt, batch_size):
+    names = [column['name'] for column in query.column_descriptions]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+
+    if writer:
+        writer.writerow(names)
+
+    rows = query.execution_options(yield_per=batch_size)
+    for count, row in enumerate(rows, 1):
+        if writer:
+            writer.writerow([_cell(value) for value in row])
+        else:
+            buffer.write(json.dumps(dict(zip(names, map(_json_value, row))), ensure_ascii=False))
+            buffer.write('\n')
+
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(kind, args):
+    """
+    Chunked download response for an export request
+
+    Args:
+        kind: Export name
+        args: Request args with 'format' (default csv) and filters
+
+    Raises:
+        ExportError for invalid requests, before the response starts
+    """
+    fmt = args.get('format', 'csv')
+    chunks = stream_export(build_export_query(kind, args), fmt)
+    filename = f"{kind}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            # Let nginx pass chunks through instead of buffering the whole file
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -1,89 +1,339 @@
-import firebase_admin
-from firebase_admin import credentials, messaging
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from models import db
+from models.user import User
 import os
+import threading
+import time
 
-# Initialize Firebase Admin SDK
-if not firebase_admin._apps:
-    if os.path.exists(Config.FIREBASE_CREDENTIALS_PATH):
-        cred = credentials.Certificate(Config.FIREBASE_CREDENTIALS_PATH)
-        firebase_admin.initialize_app(cred)
+# firebase_admin (and google-auth behind it) is imported and initialized on
+# first use, so workers and CLI commands that never push don't pay for it
+_firebase_ready = None
+_firebase_lock = threading.Lock()
 
+# FCM rejects multicast requests with more than 500 tokens
+MAX_MULTICAST_TOKENS = 500
 
-def send_push_notification(tokens, title, body, data=None):
+# Error types that will never succeed for a token; such tokens are pruned
+PERMANENT_ERRORS = ('unregistered', 'invalid_argument')
+
+
+def init_firebase():
+    """
+    Initialize the Firebase Admin SDK once per process
+
+    Thread-safe; later calls return the cached result.
+
+    Returns:
+        True if the SDK has an app to send with
+    """
+    global _firebase_ready
+    if _firebase_ready is None:
+        with _firebase_lock:
+            if _firebase_ready is None:
+                import firebase_admin
+                from firebase_admin import credentials
+
+                if not firebase_admin._apps and os.path.exists(Config.FIREBASE_CREDENTIALS_PATH):
+                    cred = credentials.Certificate(Config.FIREBASE_CREDENTIALS_PATH)
+                    firebase_admin.initialize_app(cred)
+                _firebase_ready = bool(firebase_admin._apps)
+    return _firebase_ready
+
+
+def classify_error(error):
+    """
+    Classify a per-token FCM error
+
+    Returns:
+        'unregistered' when the app was uninstalled or the token belongs to
+        another sender, 'invalid_argument' when the token is malformed and
+        'transient' for anything worth retrying
+    """
+    from firebase_admin import exceptions, messaging
+
+    if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+        return 'unregistered'
+    if isinstance(error, exceptions.InvalidArgumentError):
+        return 'invalid_argument'
+    return 'transient'
+
+
+class FirebaseTransport:
+    """Sends multicast batches through the Firebase Admin SDK"""
+
+    def is_ready(self):
+        return init_firebase()
+
+    def send_multicast(self, tokens, title, body, data, badge=1):
+        """
+        Send one multicast batch
+
+        Args:
+            badge: App icon badge shown on iOS, shared by every token in the batch
+
+        Returns:
+            list aligned with tokens: None for a delivered token,
+            otherwise the exception reported for it
+        """
+        from firebase_admin import messaging
+
+        message = messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(
+                title=title,
+                body=body
+            ),
+            data=data,
+            apns=messaging.APNSConfig(
+                payload=messaging.APNSPayload(
+                    aps=messaging.Aps(
+                        sound='default',
+                        badge=badge
+                    )
+                )
+            )
+        )
+
+        response = messaging.send_each_for_multicast(message)
+        return [r.exception for r in response.responses]
+
+
+class FakeTransport:
+    """
+    In-memory stand-in for FCM, used to benchmark the fan-out offline
+
+    Args:
+        latency: Seconds to sleep per batch, simulating the FCM round-trip
+        failing_tokens: Tokens that should be reported as unregistered
+        flaky_tokens: Dict of token -> number of transient failures
+            before the token is delivered
+    """
+
+    def __init__(self, latency=0.0, failing_tokens=None, flaky_tokens=None):
+        self.latency = latency
+        self.failing_tokens = set(failing_tokens or ())
+        self.flaky_tokens = dict(flaky_tokens or {})
+        self.batches = []
+        self.badges = []
+        self._lock = threading.Lock()
+
+    def is_ready(self):
+        return True
+
+    def send_multicast(self, tokens, title, body, data, badge=1):
+        from firebase_admin import exceptions, messaging
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        errors = []
+        with self._lock:
+            self.batches.append(list(tokens))
+            self.badges.append(badge)
+
+            for token in tokens:
+                if token in self.failing_tokens:
+                    errors.append(messaging.UnregisteredError('Requested entity was not found.'))
+                elif self.flaky_tokens.get(token, 0) > 0:
+                    self.flaky_tokens[token] -= 1
+                    errors.append(exceptions.UnavailableError('The service is currently unavailable.'))
+                else:
+                    errors.append(None)
+
+        return errors
+
+
+_transport = FirebaseTransport()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def set_transport(transport):
+    """Replace the transport used for push delivery, returning the previous one"""
+    global _transport
+    previous = _transport
+    _transport = transport
+    return previous
+
+
+def _get_executor():
+    """Shared pool that bounds concurrent FCM requests across all broadcasts"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.FCM_MAX_WORKERS,
+                    thread_name_prefix='fcm'
+                )
+    return _executor
+
+
+def _chunk(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _batches(tokens, badges):
+    """Split tokens into multicast batches that each share one badge value"""
+    batch_size = min(Config.FCM_BATCH_SIZE, MAX_MULTICAST_TOKENS)
+    groups = {}
+    for token in tokens:
+        groups.setdefault(badges.get(token, 1), []).append(token)
+
+    return [(batch, badge) for badge, group in groups.items() for batch in _chunk(group, batch_size)]
+
+
+def _send_batch(transport, tokens, title, body, data, badge):
+    """Send one batch, turning a transport-level error into per-token failures"""
+    try:
+        errors = transport.send_multicast(tokens, title, body, data, badge=badge)
+    except Exception as e:
+        print(f'FCM batch error ({len(tokens)} tokens): {e}')
+        return [(e, 'transient')] * len(tokens)
+
+    classified = [(error, classify_error(error) if error is not None else None) for error in errors]
+
+    # Every token rejected as invalid means the payload is at fault, not the tokens
+    if len(tokens) > 1 and all(error_type == 'invalid_argument' for _, error_type in classified):
+        return [(error, 'rejected') for error, _ in classified]
+
+    return classified
+
+
+def _send_tokens(transport, tokens, title, body, data, badges):
+    """Send tokens in concurrent batches, returning {token: (error, error_type)}"""
+    batches = _batches(tokens, badges)
+
+    if len(batches) == 1:
+        batch_results = [_send_batch(transport, batches[0][0], title, body, data, batches[0][1])]
+    else:
+        executor = _get_executor()
+        futures = [
+            executor.submit(_send_batch, transport, batch, title, body, data, badge)
+            for batch, badge in batches
+        ]
+        batch_results = [future.result() for future in futures]
+
+    outcome = {}
+    for (batch, _), results in zip(batches, batch_results):
+        outcome.update(zip(batch, results))
+    return outcome
+
+
+def send_push_notification(tokens, title, body, data=None, transport=None, badges=None):
     """
     Send push notification via Firebase Admin SDK
-    
+
+    Tokens are grouped into multicast batches of up to 500 which are sent
+    concurrently on a bounded worker pool; tokens with different badge
+    counts go in different batches. Transient failures are retried
+    with exponential backoff; permanent ones are reported with their type
+    so callers can prune the tokens.
+
     Args:
         tokens: List of FCM device tokens
         title: Notification title
         body: Notification body text
         data: Optional dict of additional data
-    
+        transport: Optional transport overriding the module default
+            (e.g. a FakeTransport for offline benchmarks)
+        badges: Optional dict of token -> iOS badge count (default 1)
+
     Returns:
-        dict with success/failure counts
+        dict with success/failure counts and per-token results
     """
     if not tokens:
         return {'success': 0, 'failure': 0, 'message': 'No tokens provided'}
-    
-    # Filter out empty tokens
-    valid_tokens = [t for t in tokens if t]
+
+    # Filter out empty tokens, sending each device only once
+    valid_tokens = list(dict.fromkeys(t for t in tokens if t))
     if not valid_tokens:
         return {'success': 0, 'failure': 0, 'message': 'No valid tokens'}
-    
+
+    transport = transport or _transport
+
     # Check if Firebase is initialized
-    if not firebase_admin._apps:
+    if not transport.is_ready():
         return {'success': 0, 'failure': 0, 'message': 'Firebase not initialized'}
-    
+
+    data = data or {}
+    badges = badges or {}
+    outcome = _send_tokens(transport, valid_tokens, title, body, data, badges)
+
+    for attempt in range(Config.FCM_MAX_RETRIES):
+        retry_tokens = [t for t, (_, error_type) in outcome.items() if error_type == 'transient']
+        if not retry_tokens:
+            break
+
+        time.sleep(Config.FCM_RETRY_BACKOFF * (2 ** attempt))
+        outcome.update(_send_tokens(transport, retry_tokens, title, body, data, badges))
+
+    results = []
     success_count = 0
     failure_count = 0
-    
-    # Create notification message
-    notification = messaging.Notification(
-        title=title,
-        body=body
-    )
-    
-    # Send to each token
+
     for token in valid_tokens:
-        try:
-            message = messaging.Message(
-                notification=notification,
-                data=data or {},
-                token=token,
-                apns=messaging.APNSConfig(
-                    payload=messaging.APNSPayload(
-                        aps=messaging.Aps(
-                            sound='default',
-                            badge=1
-                        )
-                    )
-                )
-            )
-            
-            response = messaging.send(message)
+        error, error_type = outcome[token]
+        if error is None:
             success_count += 1
-        except Exception as e:
-            print(f'FCM Error for token {token[:10]}...: {e}')
+        else:
+            print(f'FCM Error ({error_type}) for token {token[:10]}...: {error}')
             failure_count += 1
-    
+
+        results.append({
+            'token': token,
+            'success': error is None,
+            'error': str(error) if error is not None else None,
+            'error_type': error_type
+        })
+
     return {
         'success': success_count,
         'failure': failure_count,
-        'total': len(valid_tokens)
+        'total': len(valid_tokens),
+        'results': results
     }
 
 
+def prune_dead_tokens(results):
+    """
+    Clear User.fcm_token for every permanently failed token in one UPDATE
+
+    Args:
+        results: Per-token results from send_push_notification
+
+    Returns:
+        Number of users whose token was cleared
+    """
+    dead_tokens = [r['token'] for r in results if r['error_type'] in PERMANENT_ERRORS]
+    if not dead_tokens:
+        return 0
+
+    pruned = User.query.filter(User.fcm_token.in_(dead_tokens)).update(
+        {User.fcm_token: None},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return pruned
+
+
 def send_notification_to_users(users, notification):
     """
     Send push notification for a new notification to target users
     
+    Each device's badge is its user's unread count, looked up for the
+    whole chunk of users in one grouped query.
+
     Args:
-        users: List of User objects
+        users: List of User objects (or rows with id and fcm_token)
         notification: Notification object
     """
+    from services.unread import unread_counts
+
     # Get FCM tokens from users
-    tokens = [user.fcm_token for user in users if user.fcm_token]
+    users = [user for user in users if user.fcm_token]
+    tokens = [user.fcm_token for user in users]
     
     if not tokens:
         return {'success': 0, 'failure': 0, 'message': 'No users with FCM tokens'}
@@ -101,4 +351,12 @@ def send_notification_to_users(users, notification):
     if notification.image_url:
         data['image_url'] = notification.image_url
     
-    return send_push_notification(tokens, title, body, data)
+    counts = unread_counts([user.id for user in users])
+    badges = {user.fcm_token: counts.get(user.id, 0) for user in users}
+
+    result = send_push_notification(tokens, title, body, data, badges=badges)
+
+    # Stop paying for devices that can never receive a push again
+    result['pruned'] = prune_dead_tokens(result.get('results', []))
+
+    return result
@@ -0,0 +1,67 @@
+from sqlalchemy import select, union_all, or_, and_
+from models import db
+from models.inbox import InboxEntry
+from models.notification import Notification
+from services.inbox import inbox_enabled
+
+
+def _position_filters(created_at, row_id, cursor=None, since=None):
+    """Keyset conditions: older than cursor and/or newer than since"""
+    filters = []
+    if cursor:
+        filters.append(or_(
+            created_at < cursor[0],
+            and_(created_at == cursor[0], row_id < cursor[1])
+        ))
+    if since:
+        filters.append(or_(
+            created_at > since[0],
+            and_(created_at == since[0], row_id > since[1])
+        ))
+    return filters
+
+
+def feed_statement(user_id, is_paid, cursor=None, since=None, limit=50, inbox=None):
+    """
+    SELECT for one page of a user's notification feed, newest first
+
+    With the inbox this is one range scan over the user's inbox index.
+    Otherwise each target type the user can see ('all', 'paid' when paid,
+    their own 'specific' ones) is its own branch of a UNION ALL. Every
+    branch walks its index in feed order, so the database merges the
+    branches and stops after limit rows instead of sorting every visible
+    notification.
+
+    Args:
+        cursor/since: (created_at, id) positions from decode_cursor
+        inbox: read the per-user inbox; defaults to NOTIFICATION_INBOX
+    """
+    if inbox is None:
+        inbox = inbox_enabled()
+
+    if inbox:
+        created_at, row_id = InboxEntry.created_at, InboxEntry.notification_id
+        return select(Notification) \
+            .join(InboxEntry, InboxEntry.notification_id == Notification.id) \
+            .where(InboxEntry.user_id == user_id, *_position_filters(created_at, row_id, cursor, since)) \
+            .order_by(created_at.desc(), row_id.desc()).limit(limit)
+
+    targets = [
+        Notification.target_type == 'all',
+        and_(Notification.target_type == 'specific', Notification.target_user_id == user_id)
+    ]
+    if is_paid:
+        targets.append(Notification.target_type == 'paid')
+
+    position = _position_filters(Notification.created_at, Notification.id, cursor, since)
+    branches = union_all(*[select(Notification).where(target, *position) for target in targets])
+    columns = branches.selected_columns
+    return branches.order_by(columns.created_at.desc(), columns.id.desc()).limit(limit)
+
+
+def load_feed(user_id, is_paid, cursor=None, since=None, limit=50):
+    """One page of a user's notification feed as Notification objects, newest first"""
+    statement = feed_statement(user_id, is_paid, cursor, since, limit)
+    if not inbox_enabled():
+        statement = select(Notification).from_statement(statement)
+    return db.session.execute(statement).scalars().all()
@@ -0,0 +1,250 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, UnidentifiedImageError
+from models.meal import Meal
+from models.notification import Notification
+from config import Config
+from services.storage import get_storage
+
+# Decoded formats we accept, and the extension each is stored with
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=Config.IMAGE_WORKERS, thread_name_prefix='images')
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload is not a decodable image in an allowed format"""
+
+
+def variant_name(image_path, variant):
+    """Stored file name of a resized variant, e.g. ab/cd/abcd..._thumb.webp"""
+    stem = image_path.rsplit('.', 1)[0]
+    return f'{stem}_{variant}.webp'
+
+
+def variant_urls(image_path, base_url=''):
+    """srcset-style map of variant name -> URL for an uploaded image"""
+    urls = {
+        variant: f"{base_url}/uploads/{variant_name(image_path, variant)}"
+        for variant in Config.IMAGE_VARIANTS
+    }
+    urls['full'] = f"{base_url}/uploads/{image_path}"
+    return urls
+
+
+def _open_verified(stream):
+    """Decode the upload's actual bytes, rejecting anything that isn't a sane image"""
+    try:
+        stream.seek(0)
+        image = Image.open(stream)
+
+        # Size and format come from the header; reject before decoding any pixels
+        if image.format not in FORMAT_EXTENSIONS:
+            raise InvalidImageError(f'Unsupported image format: {image.format}')
+        if image.width * image.height > Config.IMAGE_MAX_PIXELS:
+            raise InvalidImageError('Image dimensions are too large')
+
+        image.verify()
+
+        # verify() leaves the image unusable, so decode it again
+        stream.seek(0)
+        image = Image.open(stream)
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise InvalidImageError('Uploaded file is not a valid image')
+
+    return image
+
+
+def content_path(digest, extension):
+    """Hash-sharded location of a stored image, e.g. ab/cd/abcd....jpg"""
+    return f'{digest[:2]}/{digest[2:4]}/{digest}.{extension}'
+
+
+def _spool_and_hash(stream):
+    """Copy the upload to a local temp file in one pass, hashing it on the way"""
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=Config.UPLOAD_TMP_FOLDER, prefix='upload-')
+
+    with os.fdopen(fd, 'wb') as f:
+        while True:
+            chunk = stream.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+
+    return temp_path, digest.hexdigest()
+
+
+def _temp_name(suffix=''):
+    """Unique path in the local scratch folder"""
+    folder = Config.UPLOAD_TMP_FOLDER or tempfile.gettempdir()
+    return os.path.join(folder, f'image-{uuid.uuid4().hex}{suffix}')
+
+
+def _save_full(image, source_path, filepath):
+    """Write the full-size image without EXIF/metadata, applying its orientation"""
+    if image.format == 'GIF':
+        # Keep animations intact; GIF carries no EXIF
+        shutil.copyfile(source_path, filepath)
+        return
+
+    image_format = image.format
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((Config.IMAGE_FULL_MAX_SIZE, Config.IMAGE_FULL_MAX_SIZE))
+
+    if image_format == 'JPEG':
+        image.convert('RGB').save(filepath, 'JPEG', quality=Config.IMAGE_QUALITY, optimize=True, progressive=True)
+    elif image_format == 'PNG':
+        image.save(filepath, 'PNG', optimize=True)
+    else:
+        image.save(filepath, 'WEBP', quality=Config.IMAGE_QUALITY)
+
+
+def generate_variants(source_path, image_path, storage=None):
+    """
+    Resize a local copy of the full image into the WebP variants and store them
+
+    The local source file is removed afterwards.
+    """
+    storage = storage or get_storage()
+    try:
+        with Image.open(source_path) as source:
+            source.load()
+            source = source.convert('RGBA' if source.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+            for variant, size in Config.IMAGE_VARIANTS.items():
+                resized = source.copy()
+                resized.thumbnail((size, size))
+                local = _temp_name('.webp')
+                resized.save(local, 'WEBP', quality=Config.IMAGE_QUALITY)
+                storage.save_file(local, variant_name(image_path, variant), 'image/webp')
+    except Exception as e:
+        print(f'Error generating variants for {image_path}: {e}')
+    finally:
+        if os.path.exists(source_path):
+            os.remove(source_path)
+
+
+def regenerate_variants(image_path, storage=None):
+    """Fetch a stored full image and (re)build its variants"""
+    storage = storage or get_storage()
+    local = _temp_name()
+    with storage.open(image_path) as src, open(local, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    generate_variants(local, image_path, storage)
+
+
+def save_image_upload(image_file):
+    """
+    Validate and store an uploaded image
+
+    Files are content-addressed: the upload is hashed with SHA-256 while it
+    is spooled to local scratch space and stored under a key derived from
+    the hash, so re-uploading the same image reuses the existing file. The
+    full image is re-encoded without metadata and handed to the storage
+    backend right away; thumb/medium WebP variants are generated on the
+    background image pool.
+
+    Args:
+        image_file: werkzeug FileStorage from request.files
+
+    Returns:
+        Storage key of the full image, e.g. ab/cd/abcd....jpg
+
+    Raises:
+        InvalidImageError if the bytes are not an acceptable image
+    """
+    storage = get_storage()
+    temp_path, digest = _spool_and_hash(image_file.stream)
+    full_path = None
+
+    try:
+        with open(temp_path, 'rb') as f:
+            image = _open_verified(f)
+            image_path = content_path(digest, FORMAT_EXTENSIONS[image.format])
+
+            # Same bytes were uploaded before, nothing to store
+            if storage.exists(image_path):
+                return image_path
+
+            full_path = _temp_name('.' + FORMAT_EXTENSIONS[image.format])
+            _save_full(image, temp_path, full_path)
+
+        # Keep a local copy for the variant job so it doesn't have to download it again
+        variant_source = _temp_name()
+        shutil.copyfile(full_path, variant_source)
+        try:
+            storage.save_file(full_path, image_path)
+        except Exception:
+            os.remove(variant_source)
+            raise
+    finally:
+        for path in (temp_path, full_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    _executor.submit(generate_variants, variant_source, image_path, storage)
+    return image_path
+
+
+def confirm_image_upload(image_file, image_path):
+    """
+    Make sure an uploaded image is still stored once its row is committed
+
+    save_image_upload reuses the stored file for bytes it has seen before,
+    but the new row only counts as a reference after it is committed. A
+    release_image of the last other reference that ran in between may have
+    deleted the file, so it is stored again from the upload.
+
+    Call after committing the row that points at image_path.
+
+    Returns:
+        image_path
+    """
+    if not image_path or get_storage().exists(image_path):
+        return image_path
+
+    image_file.stream.seek(0)
+    return save_image_upload(image_file)
+
+
+def count_references(image_path):
+    """Number of meals and notifications pointing at a stored image"""
+    return Meal.query.filter_by(image_path=image_path).count() + \
+        Notification.query.filter_by(image_path=image_path).count()
+
+
+def release_image(image_path):
+    """
+    Delete a stored image once no meal or notification references it
+
+    Call after the referencing row has been deleted and committed.
+
+    Returns:
+        True if the files were removed
+    """
+    if not image_path or count_references(image_path) > 0:
+        return False
+
+    delete_image(image_path)
+    return True
+
+
+def delete_image(image_path):
+    """Remove an uploaded image and its variants"""
+    storage = get_storage()
+    names = [image_path] + [variant_name(image_path, v) for v in Config.IMAGE_VARIANTS]
+
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            print(f'Error deleting image {name}: {e}')
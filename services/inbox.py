@@ -0,0 +1,122 @@
+from sqlalchemy import insert, delete, select, literal, exists, or_, and_
+from models import db
+from models.inbox import InboxEntry
+from models.notification import Notification
+from models.user import User
+from config import Config
+
+INBOX_COLUMNS = ['user_id', 'notification_id', 'created_at']
+
+
+def inbox_enabled():
+    return Config.NOTIFICATION_INBOX
+
+
+def visible_condition():
+    """SQL condition for a notification being in a user's feed (same rules as the live feed query)"""
+    return or_(
+        Notification.target_type == 'all',
+        and_(Notification.target_type == 'paid', User.is_paid == True),
+        and_(Notification.target_type == 'specific', Notification.target_user_id == User.id)
+    )
+
+
+def _missing():
+    return ~exists().where(InboxEntry.user_id == User.id, InboxEntry.notification_id == Notification.id)
+
+
+def _fill(*conditions):
+    """Insert every visible (user, notification) pair matching conditions that isn't in the inbox yet"""
+    rows = select(User.id, Notification.id, Notification.created_at) \
+        .where(visible_condition(), _missing(), *conditions)
+    return db.session.execute(insert(InboxEntry).from_select(INBOX_COLUMNS, rows)).rowcount
+
+
+def add_notification(notification):
+    """
+    Fan a new notification out to its recipients' inboxes
+
+    A single INSERT ... SELECT over the targeted users; the caller commits.
+
+    Returns:
+        Number of inbox rows written
+    """
+    if not inbox_enabled():
+        return 0
+
+    db.session.flush()
+    recipients = select(User.id, literal(notification.id), literal(notification.created_at))
+    if notification.target_type == 'paid':
+        recipients = recipients.where(User.is_paid == True)
+    elif notification.target_type == 'specific':
+        recipients = recipients.where(User.id == notification.target_user_id)
+
+    return db.session.execute(insert(InboxEntry).from_select(INBOX_COLUMNS, recipients)).rowcount
+
+
+def add_user(user):
+    """Give a new user the notifications already visible to them; the caller commits"""
+    if not inbox_enabled():
+        return 0
+
+    db.session.flush()
+    return _fill(User.id == user.id)
+
+
+def sync_paid_notifications(user_ids, is_paid):
+    """
+    Add or remove 'paid' notifications after users' paid status changed
+
+    The caller commits, together with the status change itself.
+    """
+    if not inbox_enabled() or not user_ids:
+        return 0
+
+    db.session.flush()
+    if is_paid:
+        return _fill(User.id.in_(user_ids), Notification.target_type == 'paid')
+
+    paid = select(Notification.id).where(Notification.target_type == 'paid')
+    return db.session.execute(
+        delete(InboxEntry).where(InboxEntry.user_id.in_(user_ids), InboxEntry.notification_id.in_(paid))
+    ).rowcount
+
+
+def remove_user(user_id):
+    """Drop a user's inbox before the user is deleted; the caller commits"""
+    return InboxEntry.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+
+def rebuild_inbox(batch_size=1000):
+    """
+    Bring every user's inbox in line with the targeting rules
+
+    Used to backfill before enabling NOTIFICATION_INBOX, and safe to re-run.
+    Works through users in id ranges, committing after each.
+
+    Returns:
+        (rows added, rows removed)
+    """
+    added = removed = 0
+
+    unpaid = select(User.id).where(or_(User.is_paid == False, User.is_paid.is_(None)))
+    paid = select(Notification.id).where(Notification.target_type == 'paid')
+    removed = db.session.execute(
+        delete(InboxEntry).where(InboxEntry.user_id.in_(unpaid), InboxEntry.notification_id.in_(paid))
+    ).rowcount
+    db.session.commit()
+
+    last_id = 0
+    while True:
+        upper = db.session.query(User.id).filter(User.id > last_id) \
+            .order_by(User.id).offset(batch_size - 1).limit(1).scalar()
+        if upper is None:
+            upper = db.session.query(db.func.max(User.id)).scalar()
+            if upper is None or upper <= last_id:
+                break
+
+        added += _fill(User.id > last_id, User.id <= upper)
+        db.session.commit()
+        last_id = upper
+
+    return added, removed
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+import time
+from flask import current_app
+from models.meal import Meal
+from config import Config
+
+# key -> (expires_at, body, etag); keys include the base URL used for image links
+_entries = {}
+_lock = threading.Lock()
+
+# Upper bound on cached responses, in case of many Host header variants
+MAX_ENTRIES = 256
+
+
+def _build(payload):
+    body = current_app.json.dumps(payload).encode()
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    return body, etag
+
+
+def _get_or_build(key, builder):
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry[0] > now:
+            return entry[1], entry[2]
+
+    payload = builder()
+    if payload is None:
+        return None
+
+    body, etag = _build(payload)
+    with _lock:
+        if len(_entries) >= MAX_ENTRIES:
+            _entries.clear()
+        _entries[key] = (now + Config.MEAL_CACHE_TTL, body, etag)
+    return body, etag
+
+
+def get_catalog(category, base_url):
+    """
+    Serialized meal list for a category (or all meals when category is None)
+
+    Returns:
+        (json_body_bytes, etag) tuple
+    """
+    def build():
+        query = Meal.query
+        if category:
+            query = query.filter_by(category=category)
+        meals = query.order_by(Meal.created_at.desc()).all()
+        return {
+            'meals': [meal.to_dict(base_url) for meal in meals],
+            'total': len(meals)
+        }
+
+    # Unknown categories are answered uncached so they can't fill the cache
+    if category and category not in Config.MEAL_CATEGORIES:
+        return _build(build())
+
+    return _get_or_build(('catalog', category, base_url), build)
+
+
+def get_meal(meal_id, base_url):
+    """
+    Serialized single meal
+
+    Returns:
+        (json_body_bytes, etag) tuple, or None if the meal doesn't exist
+    """
+    def build():
+        meal = Meal.query.get(meal_id)
+        return {'meal': meal.to_dict(base_url)} if meal else None
+
+    return _get_or_build(('meal', meal_id, base_url), build)
+
+
+def invalidate():
+    """Drop all cached meal responses; call after any meal is created or deleted"""
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,139 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+
+ARGON2_PREFIX = '$argon2'
+
+_executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_WORKERS, thread_name_prefix='passwords')
+
+# Verifications running or waiting for a worker; beyond this logins are shed
+_slots = threading.BoundedSemaphore(Config.PASSWORD_WORKERS + Config.PASSWORD_MAX_QUEUE)
+
+_argon2_hasher = None
+_method_prefixes = {}
+
+
+class PasswordBusyError(Exception):
+    """Raised when too many password checks are already queued"""
+
+
+def _argon2():
+    """argon2-cffi PasswordHasher, only needed when PASSWORD_HASH_METHOD is 'argon2'"""
+    global _argon2_hasher
+    if _argon2_hasher is None:
+        try:
+            from argon2 import PasswordHasher
+        except ImportError:
+            raise RuntimeError("PASSWORD_HASH_METHOD 'argon2' requires the argon2-cffi package")
+        _argon2_hasher = PasswordHasher()
+    return _argon2_hasher
+
+
+def hash_password(password, method=None):
+    """
+    Hash a password with the configured algorithm
+
+    Args:
+        method: 'argon2' or a Werkzeug method such as 'scrypt:32768:8:1'
+            or 'pbkdf2:sha256:600000'; defaults to PASSWORD_HASH_METHOD
+    """
+    method = method or Config.PASSWORD_HASH_METHOD
+    if method == 'argon2':
+        return _argon2().hash(password)
+    return generate_password_hash(password, method=method)
+
+
+def check_password(password_hash, password):
+    """Verify a password against any supported hash format, on the calling thread"""
+    if password_hash.startswith(ARGON2_PREFIX):
+        from argon2.exceptions import VerificationError, InvalidHashError
+        try:
+            return _argon2().verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(password_hash, password)
+
+
+def _method_prefix(method):
+    """Parameter prefix Werkzeug writes for a method, e.g. 'scrypt' -> 'scrypt:32768:8:1'"""
+    if method not in _method_prefixes:
+        _method_prefixes[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _method_prefixes[method]
+
+
+def needs_rehash(password_hash):
+    """True when a hash was made with a different algorithm or cost than configured"""
+    method = Config.PASSWORD_HASH_METHOD
+    if method == 'argon2':
+        if not password_hash.startswith(ARGON2_PREFIX):
+            return True
+        return _argon2().check_needs_rehash(password_hash)
+
+    return password_hash.split('$', 1)[0] != _method_prefix(method)
+
+
+def verify_password(password_hash, password):
+    """
+    Verify a password on the bounded hashing pool
+
+    Key derivation releases the GIL, so checks run in parallel on up to
+    PASSWORD_WORKERS threads without pinning every request thread.
+
+    Raises:
+        PasswordBusyError if PASSWORD_MAX_QUEUE checks are already waiting
+            for more than PASSWORD_QUEUE_TIMEOUT seconds
+    """
+    if not _slots.acquire(timeout=Config.PASSWORD_QUEUE_TIMEOUT):
+        raise PasswordBusyError('Too many login attempts in progress')
+
+    try:
+        return _executor.submit(check_password, password_hash, password).result()
+    finally:
+        _slots.release()
+
+
+def benchmark(method, seconds=2.0, threads=1):
+    """
+    Measure verifications per second for a hashing method
+
+    Returns:
+        dict with method, threads, verifications, seconds and per_second
+    """
+    password = 'benchmark-password'
+    password_hash = hash_password(password, method)
+    deadline = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def run(i):
+        while time.perf_counter() < deadline:
+            check_password(password_hash, password)
+            counts[i] += 1
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'method': method,
+        'threads': threads,
+        'verifications': sum(counts),
+        'seconds': elapsed,
+        'per_second': sum(counts) / elapsed
+    }
+
+
+def available_methods():
+    """Hashing methods worth benchmarking in this environment"""
+    methods = ['pbkdf2:sha256:600000', 'scrypt:16384:8:1', 'scrypt:32768:8:1']
+    try:
+        import argon2  # noqa: F401
+        methods.append('argon2')
+    except ImportError:
+        pass
+    return methods
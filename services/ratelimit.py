@@ -0,0 +1,232 @@
+import math
+import threading
+import time
+from functools import wraps
+from flask import request, jsonify, make_response
+from config import Config
+
+
+class MemoryBackend:
+    """Sliding-window counters kept in this process"""
+
+    MAX_KEYS = 100000
+
+    def __init__(self):
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, now=None, count=True):
+        """
+        Count one attempt against key unless it is over the limit
+
+        With count=False only reports whether an attempt would be allowed.
+
+        Returns:
+            (allowed, retry_after_seconds)
+        """
+        now = time.time() if now is None else now
+        start = now - now % window
+
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[0] < start - window:
+                entry = [start, 0, 0]
+            elif entry[0] < start:
+                # Roll over: the old current window becomes the previous one
+                entry = [start, 0, entry[1] if entry[0] == start - window else 0]
+
+            allowed, retry_after = _decide(entry[1], entry[2], limit, window, now - start)
+            if allowed and count:
+                entry[1] += 1
+            self._windows[key] = entry
+
+            if len(self._windows) > self.MAX_KEYS:
+                self._windows = {k: v for k, v in self._windows.items() if v[0] >= start - window}
+
+        return allowed, retry_after
+
+    def reset(self):
+        with self._lock:
+            self._windows.clear()
+
+
+class RedisBackend:
+    """
+    Sliding-window counters shared through Redis (or anything speaking its
+    protocol, e.g. fakeredis in tests), so limits hold across workers
+    """
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key, limit, window, now=None, count=True):
+        now = time.time() if now is None else now
+        start = int(now - now % window)
+        current_key = f'{self.prefix}{key}:{start}'
+        previous_key = f'{self.prefix}{key}:{start - window}'
+
+        current, previous = self.client.mget(current_key, previous_key)
+        allowed, retry_after = _decide(int(current or 0), int(previous or 0), limit, window, now - start)
+
+        if allowed and count:
+            pipe = self.client.pipeline()
+            pipe.incr(current_key)
+            pipe.expire(current_key, window * 2)
+            pipe.execute()
+
+        return allowed, retry_after
+
+    def reset(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+
+def _decide(current, previous, limit, window, elapsed):
+    """Weigh the previous window by how much of it still overlaps the sliding window"""
+    estimated = previous * (window - elapsed) / window + current
+    if estimated < limit:
+        return True, 0
+    return False, max(1, math.ceil(window - elapsed))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def create_backend(config=Config):
+    """Build the backend selected by RATELIMIT_BACKEND"""
+    if config.RATELIMIT_BACKEND == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATELIMIT_BACKEND=redis requires the redis package')
+        return RedisBackend(redis.Redis.from_url(config.RATELIMIT_REDIS_URL))
+    return MemoryBackend()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the limiter backend, returning the previous one"""
+    global _backend
+    previous = _backend
+    _backend = backend
+    return previous
+
+
+def _record(scope, outcome):
+    with _metrics_lock:
+        counts = _metrics.setdefault(scope, {'allowed': 0, 'limited': 0})
+        counts[outcome] += 1
+
+
+def get_metrics():
+    """Allowed/limited request counts per scope since this process started"""
+    with _metrics_lock:
+        return {scope: dict(counts) for scope, counts in _metrics.items()}
+
+
+def check(scope, limits, peek=()):
+    """
+    Count a request against each (key, (limit, window)) pair
+
+    Stops at the first exhausted limit. Keys in peek are only checked,
+    not charged; see charge().
+
+    Returns:
+        Seconds to wait before retrying, or 0 if the request is allowed
+    """
+    backend = get_backend()
+    for key, (limit, window) in limits:
+        try:
+            allowed, retry_after = backend.hit(f'{scope}:{key}', limit, window, count=key not in peek)
+        except Exception as e:
+            # Never lock everyone out because the limiter store is down
+            print(f'Rate limiter error: {e}')
+            return 0
+        if not allowed:
+            _record(scope, 'limited')
+            return retry_after
+
+    _record(scope, 'allowed')
+    return 0
+
+
+def charge(scope, limits):
+    """Count an attempt against limits that check() only peeked at"""
+    backend = get_backend()
+    for key, (limit, window) in limits:
+        try:
+            backend.hit(f'{scope}:{key}', limit, window)
+        except Exception as e:
+            print(f'Rate limiter error: {e}')
+
+
+def _json_limited(retry_after):
+    return jsonify({'error': 'Too many attempts, please try again later'})
+
+
+def _login_failed(response):
+    return response.status_code == 401
+
+
+def rate_limit(scope, per_ip, per_account=None, account_field=None, limited_response=None,
+               account_failed=None):
+    """
+    Throttle an endpoint by client IP and, optionally, by the account it targets
+
+    Runs before the view, so rejected requests cost no database or
+    password-hash work. Every attempt counts against the IP limit. The
+    account limit is only checked up front and charged when the attempt
+    fails, so successful logins never use it up.
+
+    Args:
+        scope: Name the counters and metrics are kept under
+        per_ip: (limit, window_seconds) per client address
+        per_account: (limit, window_seconds) of failed attempts per account identifier
+        account_field: JSON or form field holding the account identifier
+        limited_response: Callable(retry_after) building the 429 response
+            body; defaults to a JSON error
+        account_failed: Callable(response) telling whether the view's
+            response is a failed attempt; defaults to a 401 status
+    """
+    limited_response = limited_response or _json_limited
+    account_failed = account_failed or _login_failed
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not Config.RATELIMIT_ENABLED or request.method in ('GET', 'HEAD', 'OPTIONS'):
+                return f(*args, **kwargs)
+
+            account_limits = []
+            if per_account and account_field:
+                data = request.get_json(silent=True) if request.is_json else request.form
+                account = str((data or {}).get(account_field) or '').strip().lower()
+                if account:
+                    account_limits.append((f'account:{account}', per_account))
+
+            limits = [(f'ip:{request.remote_addr}', per_ip)] + account_limits
+            retry_after = check(scope, limits, peek={key for key, _ in account_limits})
+            if retry_after:
+                return limited_response(retry_after), 429, {'Retry-After': str(retry_after)}
+
+            if not account_limits:
+                return f(*args, **kwargs)
+
+            response = make_response(f(*args, **kwargs))
+            if account_failed(response):
+                charge(scope, account_limits)
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,198 @@
+import re
+import unicodedata
+from sqlalchemy import event
+from models import db
+from models.meal import Meal
+
+# Harakat, superscript alef and Quranic annotation marks
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+_TATWEEL = '\u0640'
+_LETTER_MAP = str.maketrans({
+    '\u0623': '\u0627',  # أ -> ا
+    '\u0625': '\u0627',  # إ -> ا
+    '\u0622': '\u0627',  # آ -> ا
+    '\u0671': '\u0627',  # ٱ -> ا
+    '\u0649': '\u064a',  # ى -> ي
+    '\u0629': '\u0647',  # ة -> ه
+})
+_WORDS = re.compile(r'\w+')
+
+# Definite article and its common attached forms: وال، بال، كال، فال، لل، ال
+_ARTICLES = ('\u0648\u0627\u0644', '\u0628\u0627\u0644', '\u0643\u0627\u0644', '\u0641\u0627\u0644', '\u0644\u0644', '\u0627\u0644')
+
+
+def normalize_arabic(text):
+    """
+    Normalize text for searching
+
+    Folds presentation forms, strips diacritics and tatweel, unifies
+    alef/ya/ta-marbuta variants and lowercases Latin letters, so that
+    'الفُول' and 'الفول' match the same meals.
+    """
+    if not text:
+        return ''
+
+    text = unicodedata.normalize('NFKC', text)
+    text = _DIACRITICS.sub('', text).replace(_TATWEEL, '')
+    return text.translate(_LETTER_MAP).lower()
+
+
+def search_terms(query):
+    """Normalized words of a search query"""
+    return _WORDS.findall(normalize_arabic(query))
+
+
+def index_text(*texts):
+    """
+    Build the searchable text for a meal
+
+    Words carrying the definite article are indexed with and without it,
+    so searching 'فول' also finds 'الفول' and 'بالفول'.
+    """
+    words = []
+    for text in texts:
+        for word in search_terms(text):
+            words.append(word)
+            for article in _ARTICLES:
+                if word.startswith(article) and len(word) - len(article) >= 2:
+                    words.append(word[len(article):])
+                    break
+    return ' '.join(words)
+
+
+@event.listens_for(Meal, 'before_insert')
+@event.listens_for(Meal, 'before_update')
+def _update_search_text(mapper, connection, meal):
+    meal.search_text = index_text(meal.title, meal.description)
+
+
+# Keep meals_fts in step with meals.search_text
+_FTS_TRIGGERS = {
+    'meals_fts_ai': (
+        "AFTER INSERT ON meals BEGIN "
+        "INSERT INTO meals_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+    ),
+    'meals_fts_ad': (
+        "AFTER DELETE ON meals BEGIN "
+        "INSERT INTO meals_fts(meals_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END"
+    ),
+    'meals_fts_au': (
+        "AFTER UPDATE ON meals BEGIN "
+        "INSERT INTO meals_fts(meals_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+        "INSERT INTO meals_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+    ),
+}
+
+
+def _has_fts5(connection):
+    try:
+        connection.execute(db.text("SELECT fts5('x')"))
+    except Exception as e:
+        # 'wrong number of arguments' means the function exists
+        return 'no such function' not in str(e)
+    return True
+
+
+def ensure_search_index():
+    """
+    Create the meal search index and backfill meals missing search text
+
+    SQLite gets an FTS5 table over meals.search_text kept in sync by
+    triggers; Postgres gets a GIN index on its tsvector.
+    """
+    backfill = Meal.query.filter(Meal.search_text.is_(None)).all()
+    for meal in backfill:
+        _update_search_text(None, None, meal)
+    if backfill:
+        db.session.commit()
+
+    dialect = db.engine.dialect.name
+
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite' and _has_fts5(conn):
+            existing = {row[0] for row in conn.execute(db.text(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE 'meals_fts%'"
+            ))}
+            # Rebuilding the meals table (e.g. a batch migration) drops its
+            # triggers but leaves meals_fts behind, so check every piece
+            if {'meals_fts', *_FTS_TRIGGERS} <= existing:
+                return
+
+            conn.execute(db.text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS meals_fts USING fts5("
+                "search_text, content='meals', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+            for name, body in _FTS_TRIGGERS.items():
+                conn.execute(db.text(f'CREATE TRIGGER IF NOT EXISTS {name} {body}'))
+            conn.execute(db.text("INSERT INTO meals_fts(meals_fts) VALUES ('rebuild')"))
+
+        elif dialect == 'postgresql':
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS ix_meals_search_tsv ON meals "
+                "USING gin (to_tsvector('simple', coalesce(search_text, '')))"
+            ))
+
+
+def _fts_available():
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return True
+    if dialect == 'sqlite':
+        return db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meals_fts'"
+        )).first() is not None
+    return False
+
+
+def search_meals(query, category=None, limit=20, offset=0):
+    """
+    Search meals by keyword, best matches first
+
+    Every word must match, as a prefix, somewhere in the title or
+    description. Uses FTS5 on SQLite and tsvector on Postgres, falling
+    back to LIKE on other databases.
+
+    Returns:
+        (meals, total) where meals is the requested page
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], 0
+
+    dialect = db.engine.dialect.name
+    params = {'limit': limit, 'offset': offset, 'category': category}
+    category_filter = 'AND m.category = :category' if category else ''
+
+    if _fts_available() and dialect == 'sqlite':
+        params['match'] = ' '.join(f'"{term}"*' for term in terms)
+        base = (
+            "FROM meals_fts JOIN meals m ON m.id = meals_fts.rowid "
+            f"WHERE meals_fts MATCH :match {category_filter}"
+        )
+        ranked = f"SELECT m.id {base} ORDER BY bm25(meals_fts), m.id DESC LIMIT :limit OFFSET :offset"
+
+    elif _fts_available() and dialect == 'postgresql':
+        params['match'] = ' & '.join(f'{term}:*' for term in terms)
+        base = (
+            "FROM meals m WHERE to_tsvector('simple', coalesce(m.search_text, '')) "
+            f"@@ to_tsquery('simple', :match) {category_filter}"
+        )
+        ranked = (
+            f"SELECT m.id {base} ORDER BY ts_rank(to_tsvector('simple', coalesce(m.search_text, '')), "
+            "to_tsquery('simple', :match)) DESC, m.id DESC LIMIT :limit OFFSET :offset"
+        )
+
+    else:
+        conditions = []
+        for i, term in enumerate(terms):
+            params[f'term{i}'] = f'%{term}%'
+            conditions.append(f'm.search_text LIKE :term{i}')
+        base = f"FROM meals m WHERE {' AND '.join(conditions)} {category_filter}"
+        ranked = f"SELECT m.id {base} ORDER BY m.created_at DESC, m.id DESC LIMIT :limit OFFSET :offset"
+
+    total = db.session.execute(db.text(f'SELECT count(*) {base}'), params).scalar()
+    ids = [row[0] for row in db.session.execute(db.text(ranked), params)]
+
+    by_id = {meal.id: meal for meal in Meal.query.filter(Meal.id.in_(ids)).all()} if ids else {}
+    return [by_id[meal_id] for meal_id in ids if meal_id in by_id], total
@@ -0,0 +1,49 @@
+import threading
+import time
+from sqlalchemy import func, case
+from models import db
+from models.user import User
+from config import Config
+
+_cache = {'expires_at': 0, 'stats': None}
+_lock = threading.Lock()
+
+
+def get_user_stats():
+    """
+    User counts for the admin pages, computed with a single aggregate query
+
+    Results are cached in-process for USER_STATS_CACHE_TTL seconds.
+
+    Returns:
+        dict with total, paid, unpaid and with_token counts
+    """
+    now = time.monotonic()
+    with _lock:
+        if _cache['stats'] and _cache['expires_at'] > now:
+            return dict(_cache['stats'])
+
+    total, paid, with_token = db.session.query(
+        func.count(User.id),
+        func.coalesce(func.sum(case((User.is_paid == True, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((User.fcm_token.isnot(None), 1), else_=0)), 0)
+    ).one()
+
+    stats = {
+        'total': total,
+        'paid': paid,
+        'unpaid': total - paid,
+        'with_token': with_token
+    }
+
+    with _lock:
+        _cache['stats'] = stats
+        _cache['expires_at'] = now + Config.USER_STATS_CACHE_TTL
+
+    return dict(stats)
+
+
+def invalidate_user_stats():
+    """Forget cached counts; call after changing users' paid status or deleting users"""
+    with _lock:
+        _cache['stats'] = None
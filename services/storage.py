@@ -0,0 +1,161 @@
+import mimetypes
+import os
+import shutil
+import threading
+import uuid
+from werkzeug.security import safe_join
+from config import Config
+
+
+class LocalStorage:
+    """Stores uploads on the local filesystem under a root directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        """Absolute path of a key, or None if the key escapes the root"""
+        return safe_join(self.root, key)
+
+    def save_file(self, local_path, key, content_type=None):
+        """Move a finished local file into storage, atomically replacing any existing one"""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        # Move next to the target first so the final rename is atomic even across filesystems
+        partial = f'{target}.{uuid.uuid4().hex}.partial'
+        shutil.move(local_path, partial)
+        os.replace(partial, target)
+
+    def save_stream(self, stream, key, content_type=None):
+        """Write a readable binary stream to storage"""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        partial = f'{target}.{uuid.uuid4().hex}.partial'
+        with open(partial, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        os.replace(partial, target)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def exists(self, key):
+        path = self.path(key)
+        return bool(path) and os.path.isfile(path)
+
+    def delete(self, key):
+        path = self.path(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def url(self, key):
+        """Local files are served by the /uploads route"""
+        return None
+
+
+class S3Storage:
+    """
+    Stores uploads in an S3-compatible bucket (AWS S3, MinIO, R2, ...)
+
+    Reads are redirects: to S3_PUBLIC_URL (e.g. a CDN in front of a public
+    bucket) when set, otherwise to a presigned GET URL.
+    """
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, public_url=None,
+                 presign_expires=3600, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError('STORAGE_BACKEND=s3 requires the boto3 package')
+            client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.presign_expires = presign_expires
+
+    def _object_key(self, key):
+        return f'{self.prefix}/{key}' if self.prefix else key
+
+    def _extra_args(self, key, content_type):
+        return {
+            'ContentType': content_type or mimetypes.guess_type(key)[0] or 'application/octet-stream',
+            # Keys are content-addressed, so objects never change
+            'CacheControl': 'public, max-age=31536000, immutable'
+        }
+
+    def save_file(self, local_path, key, content_type=None):
+        """Upload a finished local file (multipart for large files) and remove it"""
+        self.client.upload_file(local_path, self.bucket, self._object_key(key),
+                                ExtraArgs=self._extra_args(key, content_type))
+        os.remove(local_path)
+
+    def save_stream(self, stream, key, content_type=None):
+        """Upload a readable binary stream without buffering it in memory"""
+        self.client.upload_fileobj(stream, self.bucket, self._object_key(key),
+                                   ExtraArgs=self._extra_args(key, content_type))
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body']
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            status = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if status in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def url(self, key):
+        """URL clients should be redirected to for reading a key"""
+        if self.public_url:
+            return f'{self.public_url}/{self._object_key(key)}'
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._object_key(key)},
+            ExpiresIn=self.presign_expires
+        )
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(config=Config):
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    if config.STORAGE_BACKEND == 's3':
+        return S3Storage(
+            bucket=config.S3_BUCKET,
+            prefix=config.S3_PREFIX,
+            endpoint_url=config.S3_ENDPOINT_URL,
+            region=config.S3_REGION,
+            public_url=config.S3_PUBLIC_URL,
+            presign_expires=config.S3_PRESIGN_EXPIRES
+        )
+    return LocalStorage(config.UPLOAD_FOLDER)
+
+
+def get_storage():
+    """Process-wide storage backend"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+
+def set_storage(storage):
+    """Replace the storage backend (e.g. with one pointed at a local MinIO or moto)"""
+    global _storage
+    previous = _storage
+    _storage = storage
+    return previous
@@ -0,0 +1,373 @@
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+from models import db
+from models.user import User
+from config import Config
+from services.auth_cache import invalidate_user, invalidate_users
+from services.fcm import send_push_notification, prune_dead_tokens
+from services.inbox import sync_paid_notifications
+from services.stats import invalidate_user_stats
+
+
+def parse_paid_until(value):
+    """
+    Parse a subscription end date from a request
+
+    Accepts an ISO 8601 datetime (converted to naive UTC) or a date, which
+    means the end of that day.
+
+    Returns:
+        datetime or None when value is empty
+
+    Raises:
+        ValueError for unparseable values
+    """
+    if value in (None, ''):
+        return None
+    value = str(value).strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('paid_until must be an ISO 8601 date or datetime')
+
+    if len(value) == 10:
+        return parsed + timedelta(days=1)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def set_paid_status(user, is_paid, paid_until=None):
+    """
+    Change a user's paid status and commit
+
+    Every paid/unpaid toggle goes through here so dependent caches are
+    invalidated in one place.
+
+    Args:
+        user: User to update
+        is_paid: New status
+        paid_until: Optional subscription end for a paid user; a user made
+            paid without one has no end date
+    """
+    changed = bool(user.is_paid) != bool(is_paid)
+    user.is_paid = bool(is_paid)
+    if user.is_paid and (changed or paid_until is not None):
+        if user.paid_until != paid_until:
+            user.paid_reminder_sent_at = None
+        user.paid_until = paid_until
+    if changed:
+        sync_paid_notifications([user.id], user.is_paid)
+    db.session.commit()
+
+    invalidate_user_stats()
+    invalidate_user(user.id)
+    return user
+
+
+class BulkRequestError(ValueError):
+    """Raised for malformed or oversized bulk paid-status requests"""
+
+
+def parse_identifiers_csv(stream):
+    """
+    Read user ids and phones from an uploaded CSV
+
+    The header row must name an 'id' (or 'user_id') and/or a 'phone' column.
+
+    Returns:
+        (user_ids, phones)
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    fields = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+
+    id_field = fields.get('id') or fields.get('user_id')
+    phone_field = fields.get('phone')
+    if not id_field and not phone_field:
+        raise BulkRequestError("CSV needs a header row with an 'id' or 'phone' column")
+
+    user_ids, phones = [], []
+    for row in reader:
+        if id_field and (row.get(id_field) or '').strip():
+            user_ids.append(row[id_field].strip())
+        elif phone_field and (row.get(phone_field) or '').strip():
+            phones.append(row[phone_field].strip())
+
+    return user_ids, phones
+
+
+def _parse_is_paid(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('1', 'true', 'yes'):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ('0', 'false', 'no'):
+        return False
+    raise BulkRequestError('is_paid must be true or false')
+
+
+def parse_bulk_paid_request(request):
+    """
+    Read a bulk paid-status request, shared by the coach and admin endpoints
+
+    Accepts JSON with is_paid, optional paid_until, user_ids and phones, or
+    multipart/form-data with is_paid, optional paid_until and a CSV 'file'.
+
+    Returns:
+        (user_ids, phones, is_paid, paid_until)
+
+    Raises:
+        BulkRequestError (a ValueError) for missing or malformed fields
+    """
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        data, csv_file = request.form, request.files.get('file')
+        if not csv_file:
+            raise BulkRequestError('file is required')
+    else:
+        data, csv_file = request.get_json(silent=True) or {}, None
+
+    if data.get('is_paid') in (None, ''):
+        raise BulkRequestError('is_paid field is required')
+    is_paid = _parse_is_paid(data['is_paid'])
+    paid_until = parse_paid_until(data.get('paid_until'))
+
+    if csv_file:
+        user_ids, phones = parse_identifiers_csv(csv_file.stream)
+    else:
+        user_ids, phones = data.get('user_ids') or [], data.get('phones') or []
+
+    return user_ids, phones, is_paid, paid_until
+
+
+def bulk_set_paid_status(user_ids, phones, is_paid, paid_until=None):
+    """
+    Set the paid status of many users in one transaction
+
+    Users are resolved with one query, every change is applied with one
+    UPDATE, and dependent caches are invalidated once.
+
+    Args:
+        user_ids: User ids (ints or numeric strings)
+        phones: Phone numbers
+        is_paid: New status
+        paid_until: Optional subscription end, applied to every matched
+            user when is_paid is true (renewing already-paid users too)
+
+    Returns:
+        dict with per-identifier results and updated/unchanged/not_found counts
+
+    Raises:
+        BulkRequestError for invalid ids or more than BULK_PAID_MAX identifiers
+    """
+    is_paid = bool(is_paid)
+    try:
+        user_ids = list(dict.fromkeys(int(i) for i in user_ids or []))
+    except (TypeError, ValueError):
+        raise BulkRequestError('user_ids must be integers')
+    phones = list(dict.fromkeys(str(p).strip() for p in phones or [] if str(p).strip()))
+
+    if not user_ids and not phones:
+        raise BulkRequestError('Provide user_ids, phones or a CSV file')
+    if len(user_ids) + len(phones) > Config.BULK_PAID_MAX:
+        raise BulkRequestError(f'At most {Config.BULK_PAID_MAX} users per request')
+
+    conditions = []
+    if user_ids:
+        conditions.append(User.id.in_(user_ids))
+    if phones:
+        conditions.append(User.phone.in_(phones))
+
+    rows = db.session.query(User.id, User.phone, User.is_paid).filter(db.or_(*conditions)).all()
+    by_id = {row.id: row for row in rows}
+    by_phone = {row.phone: row for row in rows}
+
+    changed = sorted({row.id for row in rows if bool(row.is_paid) != is_paid})
+    renewed = sorted({row.id for row in rows} if is_paid and paid_until is not None else changed)
+
+    if renewed:
+        values = {User.is_paid: is_paid}
+        if is_paid:
+            values.update({User.paid_until: paid_until, User.paid_reminder_sent_at: None})
+        User.query.filter(User.id.in_(renewed)).update(values, synchronize_session=False)
+    if changed:
+        sync_paid_notifications(changed, is_paid)
+    db.session.commit()
+
+    if renewed:
+        invalidate_user_stats()
+        invalidate_users(renewed)
+
+    changed_set = set(renewed)
+
+    def outcome(row):
+        if row is None:
+            return 'not_found'
+        return 'updated' if row.id in changed_set else 'unchanged'
+
+    results = [{'user_id': i, 'status': outcome(by_id.get(i))} for i in user_ids]
+    results += [{'phone': p, 'status': outcome(by_phone.get(p))} for p in phones]
+
+    counts = {'updated': 0, 'unchanged': 0, 'not_found': 0}
+    for result in results:
+        counts[result['status']] += 1
+
+    return {
+        'is_paid': is_paid,
+        'paid_until': paid_until.isoformat() if is_paid and paid_until else None,
+        'results': results,
+        **counts
+    }
+
+
+def expire_subscriptions(now=None, batch_size=None):
+    """
+    Downgrade every paid user whose paid_until has passed
+
+    Each batch is one indexed SELECT of expired ids and one UPDATE, so a
+    run touches only expiring users and no transaction grows unbounded.
+
+    Returns:
+        Number of users downgraded
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or Config.SUBSCRIPTION_BATCH_SIZE
+    expired = (User.is_paid == True, User.paid_until.isnot(None), User.paid_until <= now)
+
+    total = 0
+    while True:
+        ids = [row[0] for row in db.session.query(User.id).filter(*expired).limit(batch_size)]
+        if not ids:
+            break
+
+        User.query.filter(User.id.in_(ids), *expired).update(
+            {User.is_paid: False},
+            synchronize_session=False
+        )
+        sync_paid_notifications(ids, False)
+        db.session.commit()
+
+        invalidate_users(ids)
+        total += len(ids)
+
+    if total:
+        invalidate_user_stats()
+    return total
+
+
+def send_expiry_reminders(now=None, days=None, batch_size=None, transport=None):
+    """
+    Push a renewal reminder to paid users whose subscription ends soon
+
+    Users are walked by id in batches; each batch is sent as FCM multicasts
+    and marked reminded in one UPDATE, so every subscription period gets
+    at most one reminder.
+
+    Args:
+        days: How far ahead to look (default SUBSCRIPTION_REMINDER_DAYS)
+        transport: Optional FCM transport (e.g. a FakeTransport)
+
+    Returns:
+        dict with reminded/sent/pruned counts
+    """
+    now = now or datetime.utcnow()
+    days = Config.SUBSCRIPTION_REMINDER_DAYS if days is None else days
+    batch_size = batch_size or Config.SUBSCRIPTION_BATCH_SIZE
+    horizon = now + timedelta(days=days)
+
+    title = 'كوتش هاني الليثي'  # Coach Hany Ellithy
+    body = 'اشتراكك ينتهي قريباً، جدد اشتراكك للاستمرار'  # Your subscription ends soon, renew to continue
+
+    stats = {'reminded': 0, 'sent': 0, 'pruned': 0}
+    last_id = 0
+    while True:
+        rows = db.session.query(User.id, User.fcm_token, User.paid_until).filter(
+            User.is_paid == True,
+            User.paid_until > now,
+            User.paid_until <= horizon,
+            User.paid_reminder_sent_at.is_(None),
+            User.id > last_id
+        ).order_by(User.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        tokens = [row.fcm_token for row in rows if row.fcm_token]
+        if tokens:
+            result = send_push_notification(tokens, title, body, {'type': 'subscription_expiring'},
+                                            transport=transport)
+            stats['sent'] += result['success']
+            stats['pruned'] += prune_dead_tokens(result.get('results', []))
+
+        User.query.filter(User.id.in_([row.id for row in rows])).update(
+            {User.paid_reminder_sent_at: now},
+            synchronize_session=False
+        )
+        db.session.commit()
+        stats['reminded'] += len(rows)
+
+    return stats
+
+
+def run_subscription_jobs(reminders=None):
+    """
+    Expire lapsed subscriptions, then send upcoming-expiry reminders
+
+    Args:
+        reminders: Send reminders (default SUBSCRIPTION_REMINDERS)
+
+    Returns:
+        dict with the expired count and reminder stats
+    """
+    reminders = Config.SUBSCRIPTION_REMINDERS if reminders is None else reminders
+    result = {'expired': expire_subscriptions()}
+    if reminders:
+        result['reminders'] = send_expiry_reminders()
+    return result
+
+
+def _scheduled_run(app):
+    with app.app_context():
+        try:
+            result = run_subscription_jobs()
+            if result['expired']:
+                print(f"Subscription job: {result['expired']} user(s) expired")
+        except Exception as e:
+            db.session.rollback()
+            print(f'Subscription job error: {e}')
+
+
+def start_scheduler(app):
+    """
+    Run the subscription jobs in-process every SUBSCRIPTION_JOB_INTERVAL seconds
+
+    Only when SUBSCRIPTION_SCHEDULER is on (needs APScheduler). Enable it
+    in one process only, or run `flask expire-subscriptions` from cron.
+
+    Returns:
+        The started scheduler, or None
+    """
+    if not Config.SUBSCRIPTION_SCHEDULER:
+        return None
+
+    try:
+        from apscheduler.schedulers.background import BackgroundScheduler
+    except ImportError:
+        raise RuntimeError('SUBSCRIPTION_SCHEDULER requires the APScheduler package')
+
+    scheduler = BackgroundScheduler(daemon=True)
+    scheduler.add_job(
+        _scheduled_run,
+        'interval',
+        seconds=Config.SUBSCRIPTION_JOB_INTERVAL,
+        args=[app],
+        id='subscription_jobs',
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now()
+    )
+    scheduler.start()
+    return scheduler
@@ -0,0 +1,194 @@
+from datetime import datetime
+from sqlalchemy import select, update, exists, func, or_, and_
+from models import db
+from models.inbox import InboxEntry
+from models.notification import Notification
+from models.notification_read import NotificationRead
+from models.user import User
+from services.auth_cache import note_seen
+from services.inbox import inbox_enabled, visible_condition
+
+
+def _newer_than_seen(created_at, notification_id):
+    """
+    SQL condition for a feed item being past its user's last-seen position
+
+    Users with no position yet have only seen what existed when they signed up.
+    """
+    return or_(
+        and_(User.notifications_seen_at.is_(None), created_at > User.created_at),
+        created_at > User.notifications_seen_at,
+        and_(created_at == User.notifications_seen_at, notification_id > User.notifications_seen_id)
+    )
+
+
+def _unread_query(*columns):
+    """Unread (user, notification) pairs joined to their user, selecting columns"""
+    if inbox_enabled():
+        return select(*columns).select_from(InboxEntry) \
+            .join(User, User.id == InboxEntry.user_id) \
+            .where(InboxEntry.read_at.is_(None),
+                   _newer_than_seen(InboxEntry.created_at, InboxEntry.notification_id))
+
+    acked = exists().where(NotificationRead.user_id == User.id,
+                           NotificationRead.notification_id == Notification.id)
+    return select(*columns).select_from(User) \
+        .join(Notification, visible_condition()) \
+        .where(_newer_than_seen(Notification.created_at, Notification.id), ~acked)
+
+
+def _seen_floor(user_ids):
+    """Earliest seen position (or signup time) among users; nothing older can be unread"""
+    return db.session.execute(
+        select(func.min(func.coalesce(User.notifications_seen_at, User.created_at)))
+        .where(User.id.in_(user_ids))
+    ).scalar()
+
+
+def unread_statement(user_ids, *columns):
+    """
+    Unread query restricted to user_ids
+
+    In non-inbox mode, created_at is bounded by the users' earliest seen
+    position, so the join only walks recent notifications instead of
+    every one ever sent.
+    """
+    if inbox_enabled():
+        return _unread_query(*columns).where(InboxEntry.user_id.in_(user_ids))
+
+    query = _unread_query(*columns).where(User.id.in_(user_ids))
+    floor = _seen_floor(user_ids)
+    if floor is not None:
+        query = query.where(Notification.created_at >= floor)
+    return query
+
+
+def unread_count(user_id):
+    """Number of notifications in a user's feed they haven't seen or acknowledged"""
+    return db.session.execute(unread_statement([user_id], func.count())).scalar()
+
+
+def unread_counts(user_ids):
+    """
+    Unread counts for many users in one grouped query
+
+    Returns:
+        dict of user_id -> count; users with nothing unread are omitted
+    """
+    if not user_ids:
+        return {}
+
+    user_id = InboxEntry.user_id if inbox_enabled() else User.id
+    rows = db.session.execute(unread_statement(user_ids, user_id, func.count()).group_by(user_id))
+    return dict(rows.all())
+
+
+def mark_seen(user, position=None):
+    """
+    Mark everything up to a feed position as read
+
+    The position only ever moves forward. Commits.
+
+    Args:
+        user: User
+        position: (created_at, id) tuple such as a decoded sync_cursor;
+            defaults to the newest notification
+    """
+    if position is None:
+        newest = Notification.query.with_entities(Notification.created_at, Notification.id) \
+            .order_by(Notification.created_at.desc(), Notification.id.desc()).first()
+        if newest is None:
+            return
+        position = (newest.created_at, newest.id)
+
+    current = (user.notifications_seen_at, user.notifications_seen_id or 0)
+    if user.notifications_seen_at is None or tuple(position) > current:
+        user.notifications_seen_at, user.notifications_seen_id = position
+
+        if inbox_enabled():
+            seen_at, seen_id = position
+            db.session.execute(
+                update(InboxEntry).where(
+                    InboxEntry.user_id == user.id,
+                    InboxEntry.read_at.is_(None),
+                    or_(InboxEntry.created_at < seen_at,
+                        and_(InboxEntry.created_at == seen_at, InboxEntry.notification_id <= seen_id))
+                ).values(read_at=datetime.utcnow())
+            )
+
+    db.session.commit()
+    note_seen(user.id, (user.notifications_seen_at, user.notifications_seen_id or 0))
+
+
+def advance_seen(user, position):
+    """
+    Move a user's seen position forward to a feed position they were shown
+
+    Called for feed reads that return the newest items, so clients that
+    never call POST /read still get their badge reset. Nothing is written
+    unless the position is past the one in the user's cached state;
+    otherwise one conditional UPDATE and a commit.
+
+    Args:
+        user: state dict from get_user_state
+        position: (created_at, id) of the newest notification returned
+    """
+    seen = user['seen_position']
+    if seen is not None and tuple(position) <= seen:
+        return
+
+    user_id = user['id']
+    seen_at, seen_id = position
+    db.session.execute(
+        update(User).where(
+            User.id == user_id,
+            or_(User.notifications_seen_at.is_(None),
+                User.notifications_seen_at < seen_at,
+                and_(User.notifications_seen_at == seen_at,
+                     func.coalesce(User.notifications_seen_id, 0) < seen_id))
+        ).values(notifications_seen_at=seen_at, notifications_seen_id=seen_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    note_seen(user_id, position)
+
+
+def mark_read(user, notification_ids):
+    """
+    Acknowledge individual notifications, ignoring ones already acknowledged
+
+    Commits.
+
+    Returns:
+        Number of new acknowledgements
+    """
+    ids = {int(i) for i in notification_ids}
+    if not ids:
+        return 0
+
+    existing = {row[0] for row in db.session.query(NotificationRead.notification_id)
+                .filter(NotificationRead.user_id == user.id, NotificationRead.notification_id.in_(ids))}
+    known = {row[0] for row in db.session.query(Notification.id).filter(Notification.id.in_(ids - existing))}
+
+    now = datetime.utcnow()
+    db.session.add_all([
+        NotificationRead(user_id=user.id, notification_id=notification_id, read_at=now)
+        for notification_id in known
+    ])
+
+    if inbox_enabled():
+        db.session.execute(
+            update(InboxEntry).where(
+                InboxEntry.user_id == user.id,
+                InboxEntry.notification_id.in_(ids),
+                InboxEntry.read_at.is_(None)
+            ).values(read_at=now)
+        )
+
+    db.session.commit()
+    return len(known)
+
+
+def remove_user_reads(user_id):
+    """Drop a user's read acknowledgements before the user is deleted; the caller commits"""
+    return NotificationRead.query.filter_by(user_id=user_id).delete(synchronize_session=False)
@@ -0,0 +1,134 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from models.user import User
+from services.stats import get_user_stats
+from config import Config
+
+# Columns the user lists may be sorted by
+SORT_COLUMNS = {
+    'created_at': User.created_at,
+    'name': User.name,
+    'phone': User.phone,
+    'id': User.id,
+}
+
+_PHONE = re.compile(r'^\+?[\d\s-]+$')
+
+# (search, limit) -> (expires_at, results) for the type-ahead picker
+_suggestions = OrderedDict()
+_suggestions_lock = threading.Lock()
+MAX_SUGGESTION_ENTRIES = 512
+
+
+def prefix_filter(column, prefix):
+    """
+    Indexable 'starts with' condition
+
+    Expressed as a range (column >= prefix AND column < next prefix) rather
+    than LIKE, which SQLite can't serve from an index by default.
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return (column >= prefix) & (column < upper)
+
+
+def build_user_query(filter_type=None, search=None, sort='created_at', order='desc'):
+    """
+    Query users for the admin and coach lists
+
+    Args:
+        filter_type: 'paid', 'unpaid' or None for everyone
+        search: Phone number or name prefix
+        sort: One of SORT_COLUMNS, falls back to created_at
+        order: 'asc' or 'desc'
+    """
+    query = User.query
+
+    if filter_type == 'paid':
+        query = query.filter(User.is_paid == True)
+    elif filter_type == 'unpaid':
+        query = query.filter(User.is_paid == False)
+
+    search = (search or '').strip()
+    if search:
+        if _PHONE.match(search):
+            query = query.filter(prefix_filter(User.phone, re.sub(r'[\s-]', '', search)))
+        else:
+            query = query.filter(prefix_filter(User.name, search))
+
+    column = SORT_COLUMNS.get(sort, User.created_at)
+    if order == 'asc':
+        query = query.order_by(column.asc(), User.id.asc())
+    else:
+        query = query.order_by(column.desc(), User.id.desc())
+
+    return query
+
+
+def paginate_users(filter_type=None, search=None, sort='created_at', order='desc', page=1, limit=50):
+    """
+    One page of users
+
+    Totals for unsearched lists come from the cached user stats instead of
+    a COUNT over the filtered query.
+
+    Returns:
+        dict with users (User objects), total, page, limit and pages
+    """
+    query = build_user_query(filter_type, search, sort, order)
+    page = max(page, 1)
+
+    if search and search.strip():
+        total = query.order_by(None).count()
+    else:
+        stats = get_user_stats()
+        total = {'paid': stats['paid'], 'unpaid': stats['unpaid']}.get(filter_type, stats['total'])
+
+    users = query.limit(limit).offset((page - 1) * limit).all()
+
+    return {
+        'users': users,
+        'total': total,
+        'page': page,
+        'limit': limit,
+        'pages': max(math.ceil(total / limit), 1)
+    }
+
+
+def suggest_users(search, limit=10):
+    """
+    Type-ahead matches for a name or phone prefix, ordered by name
+
+    Results are cached briefly (LRU, USER_SEARCH_CACHE_TTL seconds) since
+    the picker fires a request for every pause in typing.
+
+    Returns:
+        list of dicts with id, name, phone and is_paid
+    """
+    search = (search or '').strip()
+    if not search:
+        return []
+
+    key = (search, limit)
+    now = time.monotonic()
+    with _suggestions_lock:
+        entry = _suggestions.get(key)
+        if entry and entry[0] > now:
+            _suggestions.move_to_end(key)
+            return entry[1]
+
+    users = build_user_query(search=search, sort='name', order='asc').limit(limit).all()
+    results = [
+        {'id': u.id, 'name': u.name, 'phone': u.phone, 'is_paid': u.is_paid}
+        for u in users
+    ]
+
+    with _suggestions_lock:
+        _suggestions[key] = (now + Config.USER_SEARCH_CACHE_TTL, results)
+        _suggestions.move_to_end(key)
+        while len(_suggestions) > MAX_SUGGESTION_ENTRIES:
+            _suggestions.popitem(last=False)
+
+    return results